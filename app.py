@@ -1,47 +1,32 @@
-import subprocess
+import time
+
+# Taken before anything else is imported, for --startup-timing
+STARTED = time.perf_counter()
+
 import sys
 import os
-import hashlib
-import random
-import time
-from datetime import datetime, timezone, timedelta
+import queue
 import tkinter as tk
 from tkinter import messagebox
 import webbrowser
 import re
 import threading
+import importlib
 
-# Check and install customtkinter
 try:
     import customtkinter as ctk
 except ImportError:
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "customtkinter"])
-        import customtkinter as ctk
-    except Exception as e:
-        messagebox.showerror(
-            "Installation Error",
-            f"Failed to install customtkinter:\n{e}\n\nTry to install manually:\npip install customtkinter"
-        )
-        sys.exit(1)
-
-# Check remaining dependencies
-try:
-    import ntplib
-    import pytz
-    import urllib3
-    import json
-    import statistics
-    from icmplib import ping
-    import requests
-except ImportError as e:
-    missing_module = str(e).split("'")[1]
     messagebox.showerror(
         "Import Error",
-        f"Failed to import module: {missing_module}\n\nInstall it with:\npip install {missing_module}"
+        "Failed to import module: customtkinter\n\nInstall it with:\npip install customtkinter"
     )
     sys.exit(1)
 
+# Only stdlib underneath; the engine and its network modules load after the window is up
+from logsink import LogSink
+
+IMPORTED = time.perf_counter()
+
 # Configure customtkinter appearance
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -79,50 +64,12 @@ class ColorScheme:
     LOG_BG = "#0d1421"         # Dark log area
     HEADER_BG = "#151f2e"      # Header matches cards
 
-ntp_servers = [
-    "time1.google.com", "time2.google.com", "time3.google.com",
-    "time4.google.com", "time.android.com", "time.aws.com",
-    "time.google.com", "time.cloudflare.com"
-]
-
-MI_SERVERS = ['sgp-api.buy.mi.com', '20.157.18.26']
-
-os.system('cls' if os.name == 'nt' else 'clear')
-
-class HTTP11Session:
-    def __init__(self):
-        self.http = urllib3.PoolManager(
-            maxsize=10,
-            retries=True,
-            timeout=urllib3.Timeout(connect=2.0, read=15.0),
-            headers={}
-        )
-
-    def make_request(self, method, url, headers=None, body=None):
-        try:
-            request_headers = {}
-            if headers:
-                request_headers.update(headers)
-                request_headers['Content-Type'] = 'application/json; charset=utf-8'
-            
-            if method == 'POST':
-                if body is None:
-                    body = '{"is_retry":true}'.encode('utf-8')
-                request_headers['Content-Length'] = str(len(body))
-                request_headers['Accept-Encoding'] = 'gzip, deflate, br'
-                request_headers['User-Agent'] = 'okhttp/4.12.0'
-                request_headers['Connection'] = 'keep-alive'
-            
-            response = self.http.request(
-                method,
-                url,
-                headers=request_headers,
-                body=body,
-                preload_content=False
-            )
-            return response
-        except Exception:
-            return None
+# How often the GUI drains the engine's event queue
+EVENT_POLL_MS = 50
+# How often buffered log lines are flushed to the log textbox
+LOG_FLUSH_MS = 100
+# Oldest lines are trimmed from the log textbox beyond this many
+MAX_LOG_LINES = 1000
 
 def _on_key_release(event):
     ctrl = (event.state & 0x4) != 0
@@ -137,6 +84,7 @@ class UpdateChecker:
     @staticmethod
     def check_for_updates():
         try:
+            import requests
             current_version = CURRENT_VERSION
             api_url = "https://api.github.com/repos/AsInsideOut/miunlocktool/releases"
             
@@ -168,6 +116,7 @@ class InstructionsWindow(ctk.CTkToplevel):
         self.after_idle(self.grab_set)
         
         self.skip_cookie_check_var = ctk.BooleanVar(value=False)
+        self.aim_server_clock_var = ctk.BooleanVar(value=app.settings['aim_server_clock'])
         self.default_ping_var = ctk.StringVar(value="300")
         self.cookies_expanded = False
         
@@ -643,6 +592,19 @@ Created for educational purposes.""")
         )
         self.cookie_checkbox.pack(anchor="w")
         
+        self.server_clock_checkbox = ctk.CTkCheckBox(
+            check_frame,
+            text="Aim at Xiaomi server clock (estimated from response Date headers)",
+            variable=self.aim_server_clock_var,
+            onvalue=True,
+            offvalue=False,
+            font=("Arial", 12),
+            text_color=ColorScheme.TEXT_PRIMARY,
+            fg_color=ColorScheme.PRIMARY,
+            hover_color=ColorScheme.PRIMARY_HOVER
+        )
+        self.server_clock_checkbox.pack(anchor="w", pady=(10, 0))
+        
         # Buttons
         button_frame = ctk.CTkFrame(settings_frame, fg_color=ColorScheme.CARD_BG)
         button_frame.pack(fill="x", pady=20, padx=20)
@@ -677,6 +639,7 @@ Created for educational purposes.""")
             
             self.app.settings['default_ping'] = ping_value
             self.app.settings['skip_cookie_check'] = self.skip_cookie_check_var.get()
+            self.app.settings['aim_server_clock'] = self.aim_server_clock_var.get()
             self.app.log_message(f"Settings saved: Default ping = {ping_value}ms")
             messagebox.showinfo("Success", "Settings saved successfully!")
         except ValueError:
@@ -701,6 +664,7 @@ class XiaomiUnlockTool:
         
         self.settings = {
             'skip_cookie_check': False,
+            'aim_server_clock': False,
             'default_ping': 300,
         }
         
@@ -713,9 +677,14 @@ class XiaomiUnlockTool:
         self.manual_time_var = ctk.StringVar(value="59.1")
         
         self.create_widgets()
-        self.session = HTTP11Session()
-        self.start_beijing_time = None
-        self.start_timestamp = None
+        self.events = queue.Queue()
+        self.log_sink = LogSink()
+        self.engine = None
+        self.process_events()
+        self.flush_log()
+        self.root.after_idle(self.preload_engine)
+        # Closing the window cancels a pending submit the same way the Exit button does
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_application)
     
     def create_widgets(self):
         # Header
@@ -935,277 +904,121 @@ class XiaomiUnlockTool:
         InstructionsWindow(self.root, self)
     
     def exit_application(self):
+        if self.engine is not None:
+            self.engine.stop()
+        self.log_sink.close()
         self.root.destroy()
         sys.exit(0)
     
     def log_message(self, message):
-        timestamp = datetime.now().strftime("[%H:%M:%S]")
-        full_message = f"{timestamp} {message}"
-        
-        self.log_text.configure(state='normal')
-        self.log_text.insert("end", full_message + "\n")
-        self.log_text.configure(state='disabled')
-        self.log_text.see("end")
-        self.root.update()
+        self.log_sink.write(message)
     
-    def get_average_ping(self):
-        all_pings = []
-        self.log_message("Starting ping measurement...")
-        
-        for server in MI_SERVERS:
-            try:
-                result = ping(server, count=2, interval=0.5, timeout=2)
-                if result.is_alive:
-                    all_pings.append(result.avg_rtt)
-                    self.log_message(f"Ping to {server}: {result.avg_rtt:.2f} ms")
-                else:
-                    self.log_message(f"Failed to ping {server}")
-            except Exception as e:
-                self.log_message(f"Ping error {server}: {e}")
-        
-        if not all_pings:
-            default = self.settings['default_ping']
-            self.log_message(f"Using default ping: {default} ms")
-            self.ping_var.set(f"Ping: {default} ms (default)")
-            return default
-        
-        avg_ping = statistics.mean(all_pings)
-        self.log_message(f"Average ping: {avg_ping:.2f} ms")
-        self.ping_var.set(f"Ping: {avg_ping:.2f} ms")
-        return avg_ping
+    def flush_log(self):
+        lines = self.log_sink.drain()
+        if lines:
+            self.log_text.configure(state='normal')
+            self.log_text.insert("end", "\n".join(lines) + "\n")
+            excess = int(self.log_text.index("end-1c").split(".")[0]) - 1 - MAX_LOG_LINES
+            if excess > 0:
+                self.log_text.delete("1.0", f"{excess + 1}.0")
+            self.log_text.configure(state='disabled')
+            self.log_text.see("end")
+        self.root.after(LOG_FLUSH_MS, self.flush_log)
     
-    def generate_device_id(self):
-        random_data = f"{random.random()}-{time.time()}"
-        device_id = hashlib.sha1(random_data.encode('utf-8')).hexdigest().upper()
-        self.device_id.set(device_id)
-        self.log_message(f"Generated deviceId: {device_id}")
-        return device_id
+    def emit(self, kind, *args):
+        # Called from engine threads: log lines go straight to the sink, the rest through the queue
+        if kind == "log":
+            self.log_sink.write(args[0])
+        else:
+            self.events.put((kind,) + args)
     
-    def get_initial_beijing_time(self):
-        client = ntplib.NTPClient()
-        beijing_tz = pytz.timezone("Asia/Shanghai")
-        
-        for server in ntp_servers:
+    def preload_engine(self):
+        # Warm the import cache off the Tk thread so pressing Start does not wait for it
+        def preload():
             try:
-                self.log_message(f"Connecting to NTP server: {server}")
-                response = client.request(server, version=3)
-                ntp_time = datetime.fromtimestamp(response.tx_time, timezone.utc)
-                beijing_time = ntp_time.astimezone(beijing_tz)
-                self.log_message(f"Time from {server}: {beijing_time.strftime('%Y-%m-%d %H:%M:%S')}")
-                self.time_var.set(f"Time synchronized: {beijing_time.strftime('%H:%M:%S')} (UTC+8)")
-                return beijing_time
-            except Exception as e:
-                self.log_message(f"NTP error {server}: {e}")
-        
-        self.log_message("Failed to connect to any NTP server!")
-        return None
-    
-    def get_synchronized_beijing_time(self, start_beijing_time, start_timestamp):
-        elapsed = time.time() - start_timestamp
-        current_time = start_beijing_time + timedelta(seconds=elapsed)
-        return current_time
-    
-    def calculate_script_time(self, ping_ms):
-        script_time = 59.091 + (166 - ping_ms) * 0.006
-        return script_time
+                importlib.import_module("engine")
+            except ImportError:
+                pass
+        threading.Thread(target=preload, name="engine-preload", daemon=True).start()
     
-    def wait_until_target_time(self, start_beijing_time, start_timestamp, script_time):
-        seconds = int(script_time)
-        milliseconds = int((script_time % 1) * 1000)
-        
-        target_time = start_beijing_time.replace(
-            hour=23, minute=59, second=seconds, 
-            microsecond=milliseconds * 1000
-        )
-        
-        current_time = self.get_synchronized_beijing_time(start_beijing_time, start_timestamp)
-        if current_time > target_time:
-            target_time = target_time + timedelta(seconds=1)
-        
-        self.log_message(f"Waiting until {target_time.strftime('%H:%M:%S.%f')}")
-        
-        def check_time():
-            current_time = self.get_synchronized_beijing_time(start_beijing_time, self.start_timestamp)
-            time_diff = (target_time - current_time).total_seconds()
-            self.time_var.set(f"Time: {current_time.strftime('%H:%M:%S')} (UTC+8)")
-            
-            if time_diff <= 0:
-                self.log_message(f"Target time reached! Submitting request...")
-                self.start_request()
-            else:
-                self.root.after(100, check_time)
-        
-        check_time()
+    def get_engine(self):
+        if self.engine is None:
+            try:
+                from engine import UnlockEngine
+            except ImportError as e:
+                messagebox.showerror(
+                    "Import Error",
+                    f"Failed to import module: {e.name}\n\nInstall it with:\npip install {e.name}"
+                )
+                return None
+            self.engine = UnlockEngine(self.settings, self.emit)
+        return self.engine
     
-    def check_unlock_status(self, cookie_value, device_id):
-        if self.settings['skip_cookie_check']:
-            self.log_message("Cookie check skipped")
-            return True
-        
-        try:
-            url = "https://sgp-api.buy.mi.com/bbs/api/global/user/bl-switch/state"
-            headers = {
-                "Cookie": f"new_bbs_serviceToken={cookie_value};deviceId={device_id};"
-            }
-            
-            response = self.session.make_request('GET', url, headers=headers)
-            if response is None:
-                self.log_message("Failed to check unlock status")
-                return False
-            
-            response_data = json.loads(response.data.decode('utf-8'))
-            response.release_conn()
-            
-            if response_data.get("code") == 100004:
-                self.log_message("Cookie expired - please get a new one")
-                messagebox.showerror("Error", "Cookie expired. Please get a fresh cookie.")
-                return False
-            
-            data = response_data.get("data", {})
-            is_pass = data.get("is_pass")
-            button_state = data.get("button_state")
-            deadline = data.get("deadline_format", "")
-            
-            if is_pass == 4:
-                if button_state == 1:
-                    self.log_message("Account ready for submission")
-                    return True
-                elif button_state == 2:
-                    self.log_message(f"Account blocked until {deadline}")
-                    messagebox.showinfo("Info", f"Account blocked until {deadline}")
-                    return False
-                elif button_state == 3:
-                    self.log_message("Account too new (less than 30 days)")
-                    messagebox.showinfo("Info", "Account must be at least 30 days old")
-                    return False
-            elif is_pass == 1:
-                self.log_message(f"Application already approved until {deadline}")
-                messagebox.showinfo("Info", f"Already approved until {deadline}")
-                return False
-        except Exception as e:
-            self.log_message(f"Status check error: {e}")
-        
-        return False
+    def process_events(self):
+        # Drain what the engine reported since the last tick; the engine never touches Tk itself
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_event(*event)
+        self.root.after(EVENT_POLL_MS, self.process_events)
     
-    def start_request(self):
-        cookie = self.cookie_value.get().strip()
-        device_id = self.device_id.get()
-        
-        url = "https://sgp-api.buy.mi.com/bbs/api/global/apply/bl-auth"
-        headers = {
-            "Cookie": f"new_bbs_serviceToken={cookie};deviceId={device_id};"
-        }
-        
-        try:
-            request_time = self.get_synchronized_beijing_time(self.start_beijing_time, self.start_timestamp)
-            self.log_message(f"Sending request at {request_time.strftime('%H:%M:%S.%f')}")
-            
-            response = self.session.make_request('POST', url, headers=headers)
-            if response is None:
-                self.log_message("Failed to send request")
-                messagebox.showerror("Error", "Failed to send request")
-                return
-            
-            response_time = self.get_synchronized_beijing_time(self.start_beijing_time, self.start_timestamp)
-            self.log_message(f"Response received at {response_time.strftime('%H:%M:%S.%f')}")
-            
-            response_data = json.loads(response.data.decode('utf-8'))
-            response.release_conn()
-            
-            code = response_data.get("code")
-            data = response_data.get("data", {})
-            
-            if code == 0:
-                apply_result = data.get("apply_result")
-                if apply_result == 1:
-                    self.log_message("Request approved!")
-                    messagebox.showinfo("Success", "Request approved!")
-                elif apply_result == 3:
-                    deadline = data.get("deadline_format", "")
-                    self.log_message(f"Submission limit reached, try again {deadline}")
-                    messagebox.showinfo("Info", f"Try again on {deadline}")
+    def handle_event(self, kind, *args):
+        if kind == "status":
+            self.status_var.set(args[0])
+        elif kind == "ping":
+            self.ping_var.set(args[0])
+        elif kind == "time":
+            self.time_var.set(args[0])
+        elif kind == "device_id":
+            self.device_id.set(args[0])
+        elif kind == "dialog":
+            severity, title, message = args
+            if severity == "error":
+                messagebox.showerror(title, message)
             else:
-                self.log_message(f"Response code: {code}")
-                
-        except Exception as e:
-            self.log_message(f"Request error: {e}")
-            messagebox.showerror("Error", f"Error: {e}")
+                messagebox.showinfo(title, message)
+        elif kind == "done":
+            self.start_button.configure(state="normal")
     
     def start_process(self):
+        engine = self.get_engine()
+        if engine is None or engine.running:
+            return
+        
         cookie = self.cookie_value.get().strip()
         if not cookie:
             messagebox.showerror("Error", "Please enter your authentication token!")
             return
         
-        self.log_message("\n========== Starting Unlock Process ==========")
-        self.status_var.set("Processing...")
-        
-        device_id = self.generate_device_id()
-        
-        if not self.check_unlock_status(cookie, device_id):
-            self.status_var.set("Check failed")
-            return
-        
-        self.start_beijing_time = self.get_initial_beijing_time()
-        if self.start_beijing_time is None:
-            messagebox.showerror("Error", "Failed to synchronize time!")
-            self.status_var.set("Time sync failed")
-            return
-        
-        self.start_timestamp = time.time()
-        
-        if self.mode_var.get() == "auto":
-            self.wait_for_ping_time()
-        else:
-            self.start_manual_mode()
-    
-    def wait_for_ping_time(self):
-        target_time = self.start_beijing_time.replace(hour=23, minute=59, second=48)
-        
-        current_time = self.get_synchronized_beijing_time(self.start_beijing_time, self.start_timestamp)
-        if current_time > target_time:
-            target_time = target_time + timedelta(seconds=1)
-        
-        self.log_message("Waiting for 23:59:48 to measure ping...")
-        self.status_var.set("Waiting for ping time...")
-        
-        def check_time():
-            current_time = self.get_synchronized_beijing_time(self.start_beijing_time, self.start_timestamp)
-            time_diff = (target_time - current_time).total_seconds()
-            self.time_var.set(f"Time: {current_time.strftime('%H:%M:%S')} (UTC+8)")
-            
-            if time_diff <= 0:
-                self.log_message("23:59:48 reached, measuring ping...")
-                avg_ping = self.get_average_ping()
-                script_time = self.calculate_script_time(avg_ping)
-                self.log_message(f"Calculated submission time: {script_time:.3f}s")
-                self.wait_until_target_time(self.start_beijing_time, self.start_timestamp, script_time)
-            else:
-                self.root.after(100, check_time)
-        
-        check_time()
-    
-    def start_manual_mode(self):
-        try:
-            script_time = float(self.manual_time_var.get())
-            if script_time < 58.5 or script_time > 59.8:
-                raise ValueError("Time must be between 58.5 and 59.8")
-            
-            self.log_message(f"Manual mode: submission time set to 23:59:{script_time}")
-            self.status_var.set("Manual mode active")
-            self.wait_until_target_time(self.start_beijing_time, self.start_timestamp, script_time)
-        except ValueError:
-            messagebox.showerror("Error", "Invalid time! Use format: 59.1 (between 58.5 and 59.8)")
+        self.start_button.configure(state="disabled")
+        engine.start(cookie, self.mode_var.get(), self.manual_time_var.get())
 
 def hide_console():
     if os.name == 'nt':
         import ctypes
         ctypes.windll.user32.ShowWindow(ctypes.windll.kernel32.GetConsoleWindow(), 0)
 
+def report_startup(root, window_ready):
+    root.update_idletasks()
+    painted = time.perf_counter()
+    print(
+        f"Startup: imports {(IMPORTED - STARTED) * 1000:.0f} ms, "
+        f"window built {(window_ready - IMPORTED) * 1000:.0f} ms, "
+        f"first paint at {(painted - STARTED) * 1000:.0f} ms"
+    )
+    root.destroy()
+
 def main():
-    hide_console()
+    # --startup-timing opens the window, reports how long each startup stage took and exits
+    startup_timing = "--startup-timing" in sys.argv[1:]
+    if not startup_timing:
+        hide_console()
     root = ctk.CTk()
     app = XiaomiUnlockTool(root)
+    if startup_timing:
+        root.after_idle(report_startup, root, time.perf_counter())
     root.mainloop()
 
 if __name__ == "__main__":
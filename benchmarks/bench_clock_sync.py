@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Clock-sync accuracy benchmark
+Runs timesync.sync_clock against local SNTP responders with a known offset.
+
+Each responder serves the local clock plus the same true offset, with its own
+delay, asymmetry and loss. The error reported is the consensus offset minus
+that true offset; "covered" is the share of runs whose error bound held it.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timesync import sync_clock
+from sntp_server import SNTPConfig, SNTPServer
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def summarize(name, values, unit="ms"):
+    print(
+        f"{name:<14} p50={percentile(values, 0.5):8.2f} {unit}  "
+        f"p95={percentile(values, 0.95):8.2f} {unit}  "
+        f"max={max(values):8.2f} {unit}  "
+        f"mean={statistics.mean(values):8.2f} {unit}"
+    )
+
+
+def run(servers, offset, runs, timeout):
+    errors = []
+    bounds = []
+    elapsed = []
+    covered = failed = 0
+    for _ in range(runs):
+        consensus = sync_clock([server.address for server in servers], timeout=timeout)
+        if consensus is None:
+            failed += 1
+            continue
+        error = consensus.offset - offset
+        errors.append(error * 1000)
+        bounds.append(consensus.error * 1000)
+        elapsed.append(consensus.elapsed * 1000)
+        covered += abs(error) <= consensus.error
+    return errors, bounds, elapsed, covered, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--servers", type=int, default=6)
+    parser.add_argument("--offset", type=float, default=250.0, help="true clock offset in ms")
+    parser.add_argument("--delay", type=float, default=30.0, help="round-trip delay per server in ms")
+    parser.add_argument("--jitter", type=float, default=5.0, help="delay jitter (sd) in ms")
+    parser.add_argument("--asymmetry", type=float, default=0.3,
+                        help="largest per-server asymmetry; servers are spread over ±this")
+    parser.add_argument("--loss", type=float, default=0.1, help="packet loss fraction per server")
+    parser.add_argument("--timeout", type=float, default=1.0, help="per-server NTP timeout in s")
+    args = parser.parse_args()
+
+    servers = []
+    for i in range(args.servers):
+        spread = 0.0 if args.servers == 1 else (2 * i / (args.servers - 1) - 1) * args.asymmetry
+        config = SNTPConfig(
+            offset=args.offset / 1000,
+            delay=args.delay / 1000,
+            jitter=args.jitter / 1000,
+            asymmetry=spread,
+            loss=args.loss,
+        )
+        servers.append(SNTPServer(config).start())
+
+    errors, bounds, elapsed, covered, failed = run(servers, args.offset / 1000, args.runs, args.timeout)
+    print(
+        f"{args.runs} syncs against {args.servers} responders, true offset {args.offset:+.1f} ms, "
+        f"delay {args.delay:.0f} ± {args.jitter:.0f} ms, asymmetry ±{args.asymmetry}, loss {args.loss:.0%}"
+    )
+    if not errors:
+        print("Every sync failed")
+        sys.exit(1)
+    summarize("|error|", [abs(e) for e in errors])
+    summarize("signed error", errors)
+    summarize("error bound", bounds)
+    summarize("sync time", elapsed)
+    print(f"covered        {covered}/{len(errors)} runs inside the reported bound, {failed} failed")
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Fire-jitter benchmark
+Measures how late the wait-and-fire logic hits short synthetic targets.
+
+Scenarios:
+    poll-100ms       the old Tk loop, checking the clock every 100 ms (after(100)) from a random phase
+    scheduler        FireScheduler: coarse sleeps, then a busy-wait over the last SPIN_WINDOW_NS
+    scheduler-nospin FireScheduler with spin_ns=0, i.e. sleeps only
+
+Lateness is the gap between the target's monotonic deadline and the moment the
+fire callback starts. Results are saved as JSON; with --thresholds, any
+scenario whose percentiles exceed its limits fails the run (exit status 1).
+
+The limits in fire_jitter_thresholds.json gate p50 and p90 only, since p99 and
+max on a shared machine mostly measure the OS scheduler. They come from six
+runs on a 1-CPU Linux VM with Python 3.13, with no --load:
+    scheduler         p50 8-10 µs     p90 11-250 µs    -> limits 100 / 500
+    scheduler-nospin  p50 150-185 µs  p90 185-440 µs   -> limits 500 / 1000
+To regenerate them, run the command below a few times on an otherwise idle
+machine and keep the largest value of each limit:
+    python bench_fire_jitter.py --scenario scheduler --scenario scheduler-nospin \
+        --record-thresholds fire_jitter_thresholds.json
+It writes this run's p50 and p90 times --headroom (default 2), rounded up.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import FireScheduler
+from timesync import SyncedClock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_THRESHOLDS = os.path.join(HERE, "fire_jitter_thresholds.json")
+
+
+def poll(clock, target_ns, period):
+    # The Tk loop checked on its own schedule, unrelated to the target's phase
+    deadline = clock.to_mono_ns(target_ns)
+    next_check = time.perf_counter() + random.uniform(0, period)
+    while True:
+        time.sleep(max(0.0, next_check - time.perf_counter()))
+        if clock.now_ns() >= target_ns:
+            return time.perf_counter_ns() - deadline
+        next_check += period
+
+
+def fire_scheduler(clock, target_ns, spin_ns):
+    deadline = clock.to_mono_ns(target_ns)
+    lateness = []
+    scheduler = FireScheduler(
+        clock, target_ns, lambda s: lateness.append(time.perf_counter_ns() - deadline), spin_ns=spin_ns
+    )
+    scheduler.start().join()
+    return lateness[0]
+
+
+SCENARIOS = {
+    "poll-100ms": lambda clock, target_ns: poll(clock, target_ns, 0.1),
+    "scheduler": lambda clock, target_ns: fire_scheduler(clock, target_ns, 3_000_000),
+    "scheduler-nospin": lambda clock, target_ns: fire_scheduler(clock, target_ns, 0),
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def burn(stop):
+    # Pure-Python CPU load competing for the GIL, like the GUI and sampler threads do
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def run(name, iterations, lead_ms):
+    clock = SyncedClock()
+    fire = SCENARIOS[name]
+    samples = []
+    for _ in range(iterations):
+        target_ns = clock.now_ns() + round(random.uniform(*lead_ms) * 1_000_000)
+        samples.append(fire(clock, target_ns))
+    return {
+        "n": len(samples),
+        "p50_us": percentile(samples, 0.5) / 1000,
+        "p90_us": percentile(samples, 0.9) / 1000,
+        "p99_us": percentile(samples, 0.99) / 1000,
+        "max_us": max(samples) / 1000,
+        "mean_us": statistics.mean(samples) / 1000,
+    }
+
+
+def record(results, headroom):
+    """Limits for each scenario's p50 and p90: this run's value times headroom, in whole µs"""
+    return {
+        name: {metric: math.ceil(r[metric] * headroom) for metric in ("p50_us", "p90_us")}
+        for name, r in results.items()
+    }
+
+
+def check(results, thresholds):
+    """Print PASS/FAIL per limit and return True if every limit holds"""
+    passed = True
+    for name, limits in thresholds.items():
+        if name not in results:
+            continue
+        for metric, limit in limits.items():
+            value = results[name][metric]
+            ok = value <= limit
+            passed &= ok
+            print(f"{'PASS' if ok else 'FAIL'} {name} {metric} = {value:.1f} (limit {limit})")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000)
+    parser.add_argument("--poll-iterations", type=int, default=200,
+                        help="iterations for the polling scenario, which takes ~100 ms each")
+    parser.add_argument("--lead", type=float, nargs=2, default=(10.0, 60.0), metavar=("MIN", "MAX"),
+                        help="how far ahead each target is, in ms")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only these scenarios (repeatable)")
+    parser.add_argument("--load", type=int, default=0, help="CPU-bound Python threads running meanwhile")
+    parser.add_argument("--output", default="fire_jitter.json", help="where to save the results")
+    parser.add_argument("--thresholds", nargs="?", const=DEFAULT_THRESHOLDS,
+                        help=f"JSON limits per scenario (default file: {DEFAULT_THRESHOLDS})")
+    parser.add_argument("--record-thresholds", metavar="PATH",
+                        help="write limits from this run's p50/p90 times --headroom to PATH")
+    parser.add_argument("--headroom", type=float, default=2.0)
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    for _ in range(args.load):
+        threading.Thread(target=burn, args=(stop,), daemon=True).start()
+
+    results = {}
+    for name in args.scenario or list(SCENARIOS):
+        iterations = args.poll_iterations if name.startswith("poll") else args.iterations
+        results[name] = run(name, iterations, args.lead)
+        r = results[name]
+        print(
+            f"{name:<18} n={r['n']:<5} p50={r['p50_us']:9.1f} µs  p90={r['p90_us']:9.1f} µs  "
+            f"p99={r['p99_us']:9.1f} µs  max={r['max_us']:9.1f} µs"
+        )
+    stop.set()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "lead_ms": list(args.lead),
+            "load_threads": args.load,
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "results": results,
+        }, f, indent=2)
+    print(f"Saved to {args.output}")
+
+    if args.record_thresholds:
+        with open(args.record_thresholds, "w", encoding="utf-8") as f:
+            json.dump(record(results, args.headroom), f, indent=2)
+            f.write("\n")
+        print(f"Thresholds written to {args.record_thresholds}")
+
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as f:
+            thresholds = json.load(f)
+        sys.exit(0 if check(results, thresholds) else 1)
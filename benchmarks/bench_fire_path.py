@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Fire-to-wire micro-benchmark
+Compares HTTP11Session.make_request against the prepared-request fire path.
+
+A local keep-alive HTTP server records when the first byte of each request
+arrives; the latency reported is the time from the call on the client side
+to that arrival, both read from the same perf_counter_ns() clock. "failover
+fire" breaks the primary connection before each fire so the request goes out
+on the standby. With --tls the server speaks TLS 1.3 (see local_tls.py);
+the number of connections it accepted shows whether armed connections were
+kept or reopened.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_session import HTTP11Session
+from local_tls import self_signed, server_context, wrap_listener
+
+RESPONSE = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 10\r\n"
+    b"\r\n"
+    b'{"code":0}'
+)
+
+
+class ArrivalServer:
+    """Minimal keep-alive HTTP server that timestamps the first byte of every request"""
+
+    def __init__(self, tls=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.port = self.sock.getsockname()[1]
+        if tls is not None:
+            self.sock = wrap_listener(self.sock, tls)
+        self.arrivals = []
+        self.connections = 0
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            conn, _ = self.sock.accept()
+            self.connections += 1
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        buffer = b""
+        while True:
+            try:
+                chunk = conn.recv(65536)
+            except OSError:
+                chunk = b""
+            if not chunk:
+                conn.close()
+                return
+            if not buffer:
+                self.arrivals.append(time.perf_counter_ns())
+            buffer += chunk
+            while b"\r\n\r\n" in buffer:
+                head, rest = buffer.split(b"\r\n\r\n", 1)
+                length = 0
+                for line in head.split(b"\r\n")[1:]:
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                if len(rest) < length:
+                    break
+                buffer = rest[length:]
+                conn.sendall(RESPONSE)
+
+
+def summarize(name, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(
+        f"{name:<16} n={len(samples):<5} "
+        f"p50={statistics.median(samples) / 1000:8.1f} µs  "
+        f"p99={p99 / 1000:8.1f} µs  "
+        f"mean={statistics.mean(samples) / 1000:8.1f} µs"
+    )
+
+
+def bench_make_request(server, session, url, headers, iterations):
+    samples = []
+    for _ in range(iterations):
+        count = len(server.arrivals)
+        started = time.perf_counter_ns()
+        response = session.make_request("POST", url, headers=headers)
+        response.data
+        response.release_conn()
+        samples.append(server.arrivals[count] - started)
+    return samples
+
+
+def bench_prepared(server, session, url, headers, iterations):
+    samples = []
+    for _ in range(iterations):
+        prepared = session.prepare("POST", url, headers=headers)
+        session.arm(prepared)
+        count = len(server.arrivals)
+        started = time.perf_counter_ns()
+        response = session.fire(prepared)
+        response.data
+        response.release_conn()
+        samples.append(server.arrivals[count] - started)
+    return samples
+
+
+def bench_failover(server, session, url, headers, iterations):
+    samples = []
+    for _ in range(iterations):
+        prepared = session.prepare("POST", url, headers=headers)
+        session.arm(prepared)
+        session.arm_standby(prepared)
+        # The primary now fails on send without is_hot() having seen it die
+        prepared.conn.sock.shutdown(socket.SHUT_WR)
+        count = len(server.arrivals)
+        started = time.perf_counter_ns()
+        response = session.fire(prepared)
+        response.data
+        response.release_conn()
+        samples.append(server.arrivals[count] - started)
+    return samples
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--failover-iterations", type=int, default=200,
+                        help="iterations for the failover fire, which opens a new connection each time")
+    parser.add_argument("--tls", action="store_true", help="serve TLS 1.3 with a throwaway certificate")
+    args = parser.parse_args()
+
+    session = HTTP11Session()
+    if args.tls:
+        cert, key = self_signed()
+        session.ssl_context.load_verify_locations(cert)
+        server = ArrivalServer(server_context(cert, key))
+        url = f"https://localhost:{server.port}/bbs/api/global/apply/bl-auth"
+    else:
+        server = ArrivalServer()
+        url = f"http://127.0.0.1:{server.port}/bbs/api/global/apply/bl-auth"
+    headers = {"Cookie": "new_bbs_serviceToken=benchmark;deviceId=BENCHMARK;"}
+
+    session.warm_up(url)
+    # Warm both paths before measuring
+    bench_make_request(server, session, url, headers, 50)
+    bench_prepared(server, session, url, headers, 50)
+
+    for name, bench, iterations in (
+        ("make_request", bench_make_request, args.iterations),
+        ("prepared fire", bench_prepared, args.iterations),
+        ("failover fire", bench_failover, args.failover_iterations),
+    ):
+        connections = server.connections
+        summarize(name, bench(server, session, url, headers, iterations))
+        print(f"{'':<16} {server.connections - connections} connections opened")
@@ -0,0 +1,42 @@
+"""
+Local TLS for the offline benchmarks
+Makes a throwaway self-signed certificate for localhost and a TLS 1.3 server context for it.
+
+Clients trust the certificate with
+    session.ssl_context.load_verify_locations(cert)
+and must connect to "localhost", the name it is issued for.
+"""
+
+import os
+import ssl
+import subprocess
+import tempfile
+
+
+def self_signed(directory=None):
+    """Create a certificate and key for localhost with the openssl CLI; returns their paths"""
+    directory = directory or tempfile.mkdtemp(prefix="miunlock-tls-")
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+            "-keyout", key, "-out", cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+def server_context(cert, key, minimum=ssl.TLSVersion.TLSv1_3):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = minimum
+    context.load_cert_chain(cert, key)
+    return context
+
+
+def wrap_listener(sock, context):
+    # The handshake runs on first read, on the connection's own thread rather than in accept()
+    return context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Xiaomi unlock API
+Serves bl-switch/state and bl-auth with the JSON shapes the tool parses.
+
+Each request is delayed by half the configured latency (plus jitter) on the
+way in and on the way out. The server clock runs --skew seconds ahead of the
+local clock, and bl-auth approves a request only if it arrives inside the
+acceptance window, given as seconds within the target minute in Beijing time
+(every minute by default, so runs need not wait for midnight). Every
+submission is reported with its distance from the window centre.
+
+Point the tool at it with:
+    MIUNLOCK_API_BASE=http://127.0.0.1:8765 MIUNLOCK_TARGET_MINUTE=HH:MM python app.py
+"""
+
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from local_tls import wrap_listener
+
+STATE_PATH = "/bbs/api/global/user/bl-switch/state"
+APPLY_PATH = "/bbs/api/global/apply/bl-auth"
+BEIJING_OFFSET = 8 * 3600
+
+
+class MockConfig:
+    def __init__(self, latency=0.0, jitter=0.0, skew=0.0, window=(59.1, 59.3), minute=None,
+                 report=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.skew = skew
+        self.window = window
+        self.minute = minute
+        self.report = report
+
+    @property
+    def centre(self):
+        return (self.window[0] + self.window[1]) / 2
+
+    def server_time(self):
+        return time.time() + self.skew
+
+    def one_way_delay(self):
+        return max(0.0, random.gauss(self.latency / 2, self.jitter / 2))
+
+
+class Arrival:
+    """One bl-auth request as the mock saw it, in server-clock seconds within the minute"""
+
+    def __init__(self, server_time, config):
+        beijing = server_time + BEIJING_OFFSET
+        self.minute = time.strftime("%H:%M", time.gmtime(beijing))
+        self.second = beijing % 60
+        self.offset = self.second - config.centre
+        self.accepted = (
+            (config.minute is None or self.minute == config.minute)
+            and config.window[0] <= self.second <= config.window[1]
+        )
+
+    def describe(self):
+        verdict = "accepted" if self.accepted else "rejected"
+        return (
+            f"bl-auth arrived at {self.minute}:{self.second:06.3f} server time, "
+            f"{self.offset * 1000:+.1f} ms from the window centre, {verdict}"
+        )
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, MockAPIHandler)
+        self.config = config
+        self.arrivals = []
+        self.lock = threading.Lock()
+
+    def record(self, arrival):
+        with self.lock:
+            self.arrivals.append(arrival)
+        print(arrival.describe(), flush=True)
+        if self.config.report:
+            with open(self.config.report, "a", encoding="utf-8") as f:
+                f.write(json.dumps({
+                    "minute": arrival.minute,
+                    "second": arrival.second,
+                    "offset_ms": arrival.offset * 1000,
+                    "accepted": arrival.accepted,
+                }) + "\n")
+
+    def summary(self):
+        with self.lock:
+            offsets = [a.offset * 1000 for a in self.arrivals]
+            accepted = sum(a.accepted for a in self.arrivals)
+        if not offsets:
+            return "No submissions received"
+        return (
+            f"{len(offsets)} submissions, {accepted} accepted, offset from centre "
+            f"median {statistics.median(offsets):+.1f} ms, "
+            f"min {min(offsets):+.1f} ms, max {max(offsets):+.1f} ms"
+        )
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def date_time_string(self, timestamp=None):
+        # Date headers follow the skewed server clock, so the server-clock estimate has something to find
+        return formatdate(self.server.config.server_time() if timestamp is None else timestamp, usegmt=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(self.server.config.one_way_delay())
+        if self.path.split("?")[0] != STATE_PATH:
+            return self.reply(404, {"code": 404, "message": "not found"})
+        if "new_bbs_serviceToken=" not in self.headers.get("Cookie", ""):
+            return self.reply(200, {"code": 100004, "message": "cookie expired"})
+        self.reply(200, {"code": 0, "data": {"is_pass": 4, "button_state": 1, "deadline_format": ""}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        time.sleep(self.server.config.one_way_delay())
+        if self.path.split("?")[0] != APPLY_PATH:
+            return self.reply(404, {"code": 404, "message": "not found"})
+
+        arrival = Arrival(self.server.config.server_time(), self.server.config)
+        self.server.record(arrival)
+        if arrival.accepted:
+            data = {"apply_result": 1, "deadline_format": ""}
+        else:
+            data = {"apply_result": 3, "deadline_format": "tomorrow"}
+        self.reply(200, {"code": 0, "data": data})
+
+    def reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        time.sleep(self.server.config.one_way_delay())
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(config, host="127.0.0.1", port=0, tls=None):
+    """Run a mock server on a daemon thread and return it; server.server_port has the port
+
+    tls is an optional server SSLContext (see local_tls.py) to serve HTTPS with.
+    """
+    server = MockAPIServer((host, port), config)
+    if tls is not None:
+        server.socket = wrap_listener(server.socket, tls)
+    threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=80.0, help="round-trip latency in ms")
+    parser.add_argument("--jitter", type=float, default=10.0, help="round-trip jitter (sd) in ms")
+    parser.add_argument("--skew", type=float, default=0.0, help="server clock minus local clock, in ms")
+    parser.add_argument("--window", type=float, nargs=2, default=(59.1, 59.3), metavar=("START", "END"),
+                        help="acceptance window in seconds within the minute")
+    parser.add_argument("--minute", help="only accept during this Beijing minute, e.g. 23:59")
+    parser.add_argument("--report", help="append every submission to this JSONL file")
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        skew=args.skew / 1000,
+        window=tuple(args.window),
+        minute=args.minute,
+        report=args.report,
+    )
+    server = MockAPIServer((args.host, args.port), config)
+    print(f"Mock API on http://{args.host}:{server.server_port}, window {config.window[0]}-{config.window[1]} s")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(server.summary())
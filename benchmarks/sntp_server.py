@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Local SNTP responder
+Answers NTP client requests with a controlled time, for offline clock-sync tests.
+
+The served time is the local clock plus --offset, so the offset a perfect
+client should measure is exactly --offset. Every answer is held back by the
+configured round-trip delay, split between the request and the reply path
+by --asymmetry (0 is symmetric, 1 puts all of it on the request path), and
+a --loss fraction of requests is dropped without an answer.
+"""
+
+import argparse
+import random
+import socket
+import struct
+import threading
+import time
+
+NTP_EPOCH_DELTA = 2208988800
+PACKET_FORMAT = "!BBBb11I"
+
+
+def to_ntp(timestamp):
+    seconds = int(timestamp)
+    fraction = int((timestamp - seconds) * 2 ** 32) & 0xFFFFFFFF
+    return seconds + NTP_EPOCH_DELTA, fraction
+
+
+class SNTPConfig:
+    def __init__(self, offset=0.0, delay=0.0, jitter=0.0, asymmetry=0.0, loss=0.0, stratum=1):
+        self.offset = offset
+        self.delay = delay
+        self.jitter = jitter
+        self.asymmetry = asymmetry
+        self.loss = loss
+        self.stratum = stratum
+
+    def path_delays(self):
+        """(request path, reply path) delays in seconds for one exchange"""
+        delay = max(0.0, random.gauss(self.delay, self.jitter))
+        forward = delay * (1 + self.asymmetry) / 2
+        return forward, delay - forward
+
+
+class SNTPServer:
+    """UDP responder on its own thread; each answer is delayed on a timer thread"""
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        self.config = config
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.host, self.port = self.sock.getsockname()
+        self.requests = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._serve, name="sntp-server", daemon=True)
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self.sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                data, client = self.sock.recvfrom(512)
+            except OSError:
+                return
+            if len(data) < 48:
+                continue
+            self.requests += 1
+            if random.random() < self.config.loss:
+                self.dropped += 1
+                continue
+            forward, back = self.config.path_delays()
+            threading.Timer(forward, self._answer, args=(data, client, back)).start()
+
+    def _answer(self, request, client, back):
+        received = time.time() + self.config.offset
+        version = (request[0] >> 3) & 0x7
+        # The client's transmit timestamp comes back as the originate timestamp
+        originate = struct.unpack("!II", request[40:48])
+        packet = struct.pack(
+            PACKET_FORMAT,
+            (version << 3) | 4,
+            self.config.stratum,
+            4,
+            -20,
+            0,
+            0,
+            0x4C4F434C,
+            *to_ntp(received),
+            *originate,
+            *to_ntp(received),
+            *to_ntp(time.time() + self.config.offset),
+        )
+        time.sleep(back)
+        try:
+            self.sock.sendto(packet, client)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10123)
+    parser.add_argument("--offset", type=float, default=0.0, help="served time minus local time, in ms")
+    parser.add_argument("--delay", type=float, default=20.0, help="added round-trip delay in ms")
+    parser.add_argument("--jitter", type=float, default=2.0, help="round-trip delay jitter (sd) in ms")
+    parser.add_argument("--asymmetry", type=float, default=0.0, help="-1..1, share of the delay on the request path")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of requests dropped")
+    args = parser.parse_args()
+
+    config = SNTPConfig(
+        offset=args.offset / 1000,
+        delay=args.delay / 1000,
+        jitter=args.jitter / 1000,
+        asymmetry=args.asymmetry,
+        loss=args.loss,
+    )
+    server = SNTPServer(config, args.host, args.port).start()
+    print(f"SNTP responder on {server.address}, offset {args.offset:+.1f} ms")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print(f"{server.requests} requests, {server.dropped} dropped")
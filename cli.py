@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Command-line entry point for Xiaomi Unlock Tool
+Runs the unlock engine headless, without importing tkinter or customtkinter
+
+Usage:
+    python cli.py --cookie TOKEN                 auto mode, as in the GUI
+    python cli.py --cookie-file token.txt --manual 59.1
+    MIUNLOCK_COOKIE=TOKEN python cli.py          keeps the token out of the process list
+"""
+
+import argparse
+import os
+import queue
+import sys
+
+from engine import UnlockEngine
+from logsink import LogSink
+
+# How often buffered log lines are printed, in seconds
+FLUSH_INTERVAL = 0.1
+
+
+def read_cookie(args):
+    if args.cookie:
+        return args.cookie.strip()
+    if args.cookie_file:
+        with open(args.cookie_file, encoding="utf-8") as f:
+            return f.read().strip()
+    return os.environ.get("MIUNLOCK_COOKIE", "").strip()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Submit a Xiaomi bootloader unlock request without the GUI")
+    parser.add_argument("--cookie", help="new_bbs_serviceToken value")
+    parser.add_argument("--cookie-file", help="file holding the token")
+    parser.add_argument("--manual", metavar="SECOND", help="submit at this second of 23:59 (58.5-59.8)")
+    parser.add_argument("--skip-cookie-check", action="store_true")
+    parser.add_argument("--aim-server-clock", action="store_true",
+                        help="aim at the API server's clock, estimated from its Date headers")
+    parser.add_argument("--default-ping", type=int, default=300, help="latency in ms if nothing can be measured")
+    args = parser.parse_args(argv)
+
+    cookie = read_cookie(args)
+    if not cookie:
+        parser.error("no token given: use --cookie, --cookie-file or MIUNLOCK_COOKIE")
+
+    settings = {
+        'skip_cookie_check': args.skip_cookie_check,
+        'aim_server_clock': args.aim_server_clock,
+        'default_ping': args.default_ping,
+    }
+    sink = LogSink()
+    events = queue.Queue()
+
+    def emit(kind, *args):
+        if kind == "log":
+            sink.write(args[0])
+        elif kind in ("dialog", "done"):
+            events.put((kind,) + args)
+
+    engine = UnlockEngine(settings, emit)
+    engine.start(cookie, "manual" if args.manual else "auto", args.manual)
+
+    success = False
+    try:
+        while True:
+            try:
+                event = events.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                event = None
+            for line in sink.drain():
+                print(line, flush=True)
+            if event is None:
+                continue
+            if event[0] == "dialog":
+                _, severity, title, message = event
+                print(f"{title}: {message}", file=sys.stderr if severity == "error" else sys.stdout, flush=True)
+            else:
+                success = event[1]
+                break
+    except KeyboardInterrupt:
+        engine.stop()
+        print("Interrupted", file=sys.stderr)
+        return 130
+    finally:
+        for line in sink.drain():
+            print(line, flush=True)
+        sink.close()
+
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
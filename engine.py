@@ -0,0 +1,698 @@
+"""
+Unlock engine for Xiaomi Unlock Tool
+Runs the unlock workflow on a worker thread and reports progress through events
+"""
+
+import hashlib
+import json
+import os
+import random
+import socket
+import statistics
+import threading
+import time
+
+from urllib3.util import parse_url
+
+from timesync import sync_clock, SyncedClock, next_daily_ns, format_hms, SECOND_NS, MINUTE_NS, DAY_NS
+from scheduler import FireScheduler
+from http_session import HTTP11Session
+from latency import LatencyProbe, LatencySampler, icmp_probe
+from timing_model import DATA_DIR, EARLIEST_SECOND, LATEST_SECOND, TimingModel, record_attempt
+from server_clock import ServerClockEstimator
+from preflight import run_preflight
+from tracing import last_trace
+
+ntp_servers = [
+    "time1.google.com", "time2.google.com", "time3.google.com",
+    "time4.google.com", "time.android.com", "time.aws.com",
+    "time.google.com", "time.cloudflare.com"
+]
+# Comma-separated "host" or "host:port" list, e.g. benchmarks/sntp_server.py instances
+if os.environ.get("MIUNLOCK_NTP_SERVERS"):
+    ntp_servers = [server.strip() for server in os.environ["MIUNLOCK_NTP_SERVERS"].split(",") if server.strip()]
+
+MI_SERVERS = ['sgp-api.buy.mi.com', '20.157.18.26']
+
+# MIUNLOCK_API_BASE points the tool at another server, such as benchmarks/mock_api.py
+API_BASE = os.environ.get("MIUNLOCK_API_BASE", "https://sgp-api.buy.mi.com").rstrip("/")
+STATE_URL = API_BASE + "/bbs/api/global/user/bl-switch/state"
+APPLY_URL = API_BASE + "/bbs/api/global/apply/bl-auth"
+
+# Beijing minute at whose end the request is submitted, as "HH:MM"
+TARGET_HOUR, TARGET_MINUTE = map(int, os.environ.get("MIUNLOCK_TARGET_MINUTE", "23:59").split(":"))
+TARGET_LABEL = f"{TARGET_HOUR:02d}:{TARGET_MINUTE:02d}"
+
+# Second of the target minute at which latency is measured in auto mode
+PING_SECOND = 48
+
+# Seconds past the end of the target minute that the submit response is still waited for
+RESPONSE_GRACE = 2
+
+# Seconds before the fire instant at which the submit connection is opened
+WARM_UP_LEAD = 5
+# Seconds between clock/latency display updates while waiting
+DISPLAY_INTERVAL = 0.2
+
+# Chrome trace-event export of the run's requests, for Perfetto
+TRACE_PATH = os.path.join(DATA_DIR, "trace.json")
+
+
+class UnlockEngine:
+    """The unlock workflow, free of any GUI code
+
+    Everything runs on a worker thread (plus the scheduler threads it starts).
+    Progress is reported by calling emit(kind, *args), which must be thread-safe:
+        ("log", message)                       a line for the execution log
+        ("status", text), ("ping", text), ("time", text), ("device_id", value)
+        ("dialog", "error" | "info", title, message)
+        ("done", success)                      the workflow has finished
+    """
+
+    def __init__(self, settings, emit):
+        self.settings = settings
+        self.emit = emit
+        self.session = HTTP11Session()
+        self.worker = None
+        self.mode = "auto"
+        self.clock = None
+        self.clock_consensus = None
+        self.scheduler = None
+        self.warm_up_scheduler = None
+        self.stopped = threading.Event()
+        self.prepared = None
+        # Guards prepared against the warm-up thread; once arming_closed is set it may not publish
+        self.arming = threading.Lock()
+        self.arming_closed = False
+        self.warm_up_done = threading.Event()
+        self.sampler = None
+        self.minute_ns = None
+        self.fire_latency = None
+        self.result = None
+        self.fire_trace = None
+        self.failed_over = False
+        self.response_deadline_ns = None
+        self.timing_model = TimingModel.load()
+        self.model_rejected = False
+        self.server_clock = None
+
+    @property
+    def running(self):
+        return self.worker is not None and self.worker.is_alive()
+
+    def start(self, cookie, mode, manual_time=None):
+        self.stopped.clear()
+        self.worker = threading.Thread(
+            target=self.run,
+            args=(cookie, mode, manual_time),
+            name="unlock-worker",
+            daemon=True
+        )
+        self.worker.start()
+
+    def run(self, cookie, mode, manual_time=None):
+        success = False
+        try:
+            success = self.start_process(cookie, mode, manual_time)
+        except Exception as e:
+            self.log_message(f"Unexpected error: {e}")
+            self.emit("status", "Failed")
+        self.export_trace()
+        self.emit("done", success)
+
+    def stop(self):
+        """Cancel any pending fire and warm-up and release held connections; safe from any thread"""
+        self.stopped.set()
+        for scheduler in (self.scheduler, self.warm_up_scheduler):
+            if scheduler is not None:
+                scheduler.cancel()
+        with self.arming:
+            self.arming_closed = True
+            prepared, self.prepared = self.prepared, None
+        if prepared is not None:
+            self.session.disarm(prepared)
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.session.stop_keep_alive()
+
+    def log_message(self, message):
+        self.emit("log", message)
+
+    def log_trace(self, trace):
+        if trace is not None:
+            self.log_message(f"Trace {trace.describe()}")
+
+    def export_trace(self):
+        try:
+            count = self.session.tracer.export(TRACE_PATH)
+        except OSError as e:
+            self.log_message(f"Could not save request trace: {e}")
+        else:
+            self.log_message(f"Saved {count} request traces to {TRACE_PATH}")
+
+    def show_error(self, title, message):
+        self.emit("dialog", "error", title, message)
+
+    def show_info(self, title, message):
+        self.emit("dialog", "info", title, message)
+
+    def measure_latency(self):
+        self.log_message("Probing latency to the API host...")
+        try:
+            probe = LatencyProbe(self.session, STATE_URL)
+            self.log_message(f"Resolved {probe.host} to {probe.resolve()}")
+            connect_stats, http_stats = probe.run()
+        except Exception as e:
+            self.log_message(f"Latency probe error: {e}")
+            connect_stats = http_stats = None
+
+        if connect_stats is not None:
+            self.log_message(f"TCP connect: {connect_stats.describe()}")
+        if http_stats is None:
+            self.log_message("HTTP probe failed, falling back to ICMP ping")
+            return self.get_average_ping()
+
+        self.log_message(f"HTTP round trip: {http_stats.describe()}")
+        if self.sampler is not None:
+            for sample in http_stats.samples:
+                self.sampler.add(sample)
+        self.emit(
+            "ping",
+            f"Latency: {http_stats.median:.1f} ms (p90 {http_stats.p90:.1f}, jitter {http_stats.jitter:.1f})"
+        )
+        return http_stats.median
+
+    def get_average_ping(self):
+        all_pings = []
+        self.log_message("Starting ping measurement...")
+
+        results = icmp_probe(MI_SERVERS)
+        for server in MI_SERVERS:
+            result = results[server]
+            if isinstance(result, Exception):
+                self.log_message(f"Ping error {server}: {result}")
+            elif result.is_alive:
+                all_pings.extend(result.rtts)
+                self.log_message(
+                    f"Ping to {server}: {result.avg_rtt:.2f} ms "
+                    f"({result.packets_received}/{result.packets_sent} replies)"
+                )
+            else:
+                self.log_message(f"Failed to ping {server}")
+
+        if not all_pings:
+            default = self.settings['default_ping']
+            self.log_message(f"Using default ping: {default} ms")
+            self.emit("ping", f"Ping: {default} ms (default)")
+            return default
+
+        avg_ping = statistics.mean(all_pings)
+        self.log_message(f"Average ping: {avg_ping:.2f} ms")
+        self.emit("ping", f"Ping: {avg_ping:.2f} ms")
+        return avg_ping
+
+    def generate_device_id(self):
+        random_data = f"{random.random()}-{time.time()}"
+        device_id = hashlib.sha1(random_data.encode('utf-8')).hexdigest().upper()
+        self.emit("device_id", device_id)
+        self.log_message(f"Generated deviceId: {device_id}")
+        return device_id
+
+    def get_initial_beijing_time(self):
+        self.log_message(f"Querying {len(ntp_servers)} NTP servers in parallel...")
+        consensus = sync_clock(ntp_servers)
+        if consensus is None:
+            self.log_message("Failed to connect to any NTP server!")
+            return None
+
+        for server, error in consensus.failed:
+            self.log_message(f"NTP error {server}: {error}")
+        for sample in consensus.rejected:
+            self.log_message(
+                f"Rejected {sample.server}: offset {sample.offset * 1000:+.1f} ms, "
+                f"delay {sample.delay * 1000:.1f} ms"
+            )
+        for sample in consensus.samples:
+            self.log_message(
+                f"NTP {sample.server}: offset {sample.offset * 1000:+.1f} ms, "
+                f"delay {sample.delay * 1000:.1f} ms"
+            )
+
+        self.clock_consensus = consensus
+        self.log_message(f"Clock consensus: {consensus.describe()}")
+
+        clock = SyncedClock.from_consensus(consensus)
+        beijing_time = clock.now()
+        self.log_message(f"Beijing time: {beijing_time.strftime('%Y-%m-%d %H:%M:%S')}")
+        self.emit(
+            "time",
+            f"Time synchronized: {beijing_time.strftime('%H:%M:%S')} (UTC+8, "
+            f"±{consensus.error * 1000:.1f} ms, {len(consensus.samples)}/{consensus.queried} servers)"
+        )
+        return clock
+
+    def calculate_script_time(self, ping_ms):
+        script_time = self.timing_model.script_time(ping_ms)
+        if EARLIEST_SECOND <= script_time <= LATEST_SECOND:
+            return script_time
+        self.reject_model(f"gives {script_time:.3f}s at {ping_ms:.1f} ms")
+        return TimingModel().script_time(ping_ms)
+
+    def arrival_second(self):
+        second = self.timing_model.arrival_second
+        if EARLIEST_SECOND <= second <= LATEST_SECOND:
+            return second
+        self.reject_model(f"aims at arrival second {second:.3f}")
+        return TimingModel().arrival_second
+
+    def reject_model(self, reason):
+        # Called on every refresh of the target, so only the first rejection is logged
+        if not self.model_rejected:
+            self.model_rejected = True
+            self.log_message(
+                f"Timing model {reason}, outside {EARLIEST_SECOND}-{LATEST_SECOND}; using the built-in formula"
+            )
+
+    def current_latency(self, fallback):
+        estimate = self.sampler.estimate() if self.sampler is not None else None
+        return fallback if estimate is None else estimate.mean
+
+    def update_display(self):
+        self.emit("time", f"Time: {format_hms(self.clock.now_ns())} (UTC+8)")
+        estimate = self.sampler.estimate() if self.sampler is not None else None
+        if estimate is not None:
+            self.emit(
+                "ping",
+                f"Latency: {estimate.mean:.1f} ± {estimate.deviation:.1f} ms (p90 {estimate.p90:.1f})"
+            )
+
+    def wait_until(self, target_ns):
+        while True:
+            remaining = target_ns - self.clock.now_ns()
+            if remaining <= 0:
+                return
+            self.update_display()
+            if self.stopped.wait(min(remaining / 1e9, DISPLAY_INTERVAL)):
+                return
+
+    def wait_until_target_time(self, cookie, device_id, script_time, fallback_ping=None):
+        auto = fallback_ping is not None
+        minute_ns = self.minute_ns
+
+        def fire_target(ping_ms):
+            if self.server_clock is not None:
+                # Aim at the arrival second on the server's clock, minus the one-way delay
+                second = self.arrival_second() if auto else script_time
+                one_way_ns = None if ping_ms is None else round(ping_ms * 500_000)
+                return self.server_clock.local_fire_ns(minute_ns + round(second * SECOND_NS), one_way_ns)
+            second = self.calculate_script_time(ping_ms) if auto else script_time
+            return minute_ns + round(second * SECOND_NS)
+
+        target_ns = fire_target(self.current_latency(fallback_ping))
+        if target_ns <= self.clock.now_ns():
+            # Too late for this minute: the next chance is the same minute tomorrow
+            self.log_message("Submission time already passed, moving to the same time tomorrow")
+            minute_ns += DAY_NS
+            target_ns += DAY_NS
+
+        target_time = SyncedClock.to_datetime(target_ns)
+        self.log_message(f"Waiting until {target_time.strftime('%Y-%m-%d %H:%M:%S.%f')}")
+        self.minute_ns = minute_ns
+        self.fire_latency = fallback_ping
+        # Past this, a response is too late to matter; bounds every wait on the submit
+        self.response_deadline_ns = self.clock.to_mono_ns(minute_ns + MINUTE_NS + RESPONSE_GRACE * SECOND_NS)
+
+        def follow_latency():
+            ping_ms = self.fire_latency = self.current_latency(fallback_ping)
+            return fire_target(ping_ms)
+
+        # Keep following the latency model until the target freezes
+        refresh = follow_latency if (auto or self.server_clock is not None) else None
+
+        self.result = None
+        self.arming_closed = False
+        self.warm_up_done.clear()
+        if self.stopped.is_set():
+            return
+        self.scheduler = FireScheduler(
+            self.clock,
+            target_ns,
+            lambda scheduler: self.start_request(cookie, device_id, scheduler),
+            refresh=refresh
+        ).start()
+        self.warm_up_scheduler = FireScheduler(
+            self.clock,
+            max(target_ns - WARM_UP_LEAD * SECOND_NS, self.clock.now_ns()),
+            lambda scheduler: self.warm_up_connection(cookie, device_id),
+            spin_ns=0,
+            name="warm-up"
+        ).start()
+
+    def resolve_api_host(self):
+        parsed = parse_url(APPLY_URL)
+        addresses = socket.getaddrinfo(parsed.host, parsed.port or 443, type=socket.SOCK_STREAM)
+        return addresses[0][4][0]
+
+    def preflight(self, cookie, device_id):
+        # Cookie check, clock sync, DNS and warm-up do not depend on each other
+        self.log_message("Running preflight checks in parallel...")
+        report = run_preflight([
+            ("cookie check", lambda: self.check_unlock_status(cookie, device_id)),
+            ("clock sync", self.get_initial_beijing_time),
+            ("DNS", self.resolve_api_host),
+            ("warm-up", lambda: self.session.warm_up(APPLY_URL)),
+        ])
+        dns = report["DNS"]
+        if dns.ok:
+            self.log_message(f"Resolved {parse_url(APPLY_URL).host} to {dns.value}")
+        self.log_message(f"Preflight {'ready' if report.ok else 'finished with problems'} in {report.describe()}")
+        return report
+
+    def estimate_server_clock(self):
+        self.log_message("Estimating server clock from Date headers...")
+        estimate = ServerClockEstimator(self.session, STATE_URL, self.clock).run()
+        if estimate is None:
+            self.log_message("Server clock estimate failed, aiming at NTP time")
+        else:
+            self.log_message(f"Server clock: {estimate.describe()}")
+        self.server_clock = estimate
+
+    def start_latency_sampler(self):
+        self.sampler = LatencySampler(LatencyProbe(self.session, STATE_URL)).start()
+        self.log_message("Background latency sampling started")
+
+    def warm_up_connection(self, cookie, device_id):
+        # Runs on the warm-up thread; sampling and heartbeats stop here to keep the line quiet until the fire
+        try:
+            message = self.arm_request(cookie, device_id)
+        finally:
+            self.warm_up_done.set()
+        self.log_message(message)
+        if self.session.ssl_context.offered:
+            self.log_message(self.session.ssl_context.describe())
+
+    def arm_request(self, cookie, device_id):
+        """Arm the submit on a live connection and hand it to the fire, unless the fire has started"""
+        if self.sampler is not None:
+            self.sampler.stop()
+        prepared = self.session.prepare('POST', APPLY_URL, headers={
+            "Cookie": f"new_bbs_serviceToken={cookie};deviceId={device_id};"
+        })
+        armed = False
+        if self.session.arm_kept(prepared):
+            armed = True
+            message = "Request prepared on a kept-alive connection"
+        else:
+            elapsed = self.session.warm_up(APPLY_URL)
+            if elapsed is None:
+                message = "Connection warm-up failed, the request will connect on demand"
+            else:
+                message = f"Connection to submission server warmed up in {elapsed * 1000:.1f} ms"
+                if self.session.arm(prepared):
+                    armed = True
+                    message += ", request prepared"
+        if armed:
+            if self.session.arm_standby(prepared):
+                message += ", standby connection ready"
+            else:
+                message += ", no standby connection"
+        keeper = self.session.stop_keep_alive()
+        if keeper is not None:
+            message += f" (keep-alive: {keeper.describe()})"
+
+        with self.arming:
+            closed = self.arming_closed
+            if armed and not closed:
+                self.prepared = prepared
+        if closed:
+            self.session.disarm(prepared)
+            message += "; the fire had already started, so its connections were released"
+        return message
+
+    def check_unlock_status(self, cookie_value, device_id):
+        if self.settings['skip_cookie_check']:
+            self.log_message("Cookie check skipped")
+            return True
+
+        try:
+            url = STATE_URL
+            headers = {
+                "Cookie": f"new_bbs_serviceToken={cookie_value};deviceId={device_id};"
+            }
+
+            response = self.session.make_request('GET', url, headers=headers)
+            self.log_trace(last_trace())
+            if response is None:
+                self.log_message("Failed to check unlock status")
+                return False
+
+            response_data = json.loads(response.data.decode('utf-8'))
+            response.release_conn()
+
+            if response_data.get("code") == 100004:
+                self.log_message("Cookie expired - please get a new one")
+                self.show_error("Error", "Cookie expired. Please get a fresh cookie.")
+                return False
+
+            data = response_data.get("data", {})
+            is_pass = data.get("is_pass")
+            button_state = data.get("button_state")
+            deadline = data.get("deadline_format", "")
+
+            if is_pass == 4:
+                if button_state == 1:
+                    self.log_message("Account ready for submission")
+                    return True
+                elif button_state == 2:
+                    self.log_message(f"Account blocked until {deadline}")
+                    self.show_info("Info", f"Account blocked until {deadline}")
+                    return False
+                elif button_state == 3:
+                    self.log_message("Account too new (less than 30 days)")
+                    self.show_info("Info", "Account must be at least 30 days old")
+                    return False
+            elif is_pass == 1:
+                self.log_message(f"Application already approved until {deadline}")
+                self.show_info("Info", f"Already approved until {deadline}")
+                return False
+        except Exception as e:
+            self.log_message(f"Status check error: {e}")
+
+        return False
+
+    def start_request(self, cookie, device_id, scheduler=None):
+        # Runs on the scheduler thread: the worker reports the result once it is in
+        with self.arming:
+            self.arming_closed = True
+            prepared, self.prepared = self.prepared, None
+        if not self.warm_up_done.is_set():
+            # The warm-up is still arming and will release what it gets; its heartbeats end now
+            self.session.stop_keep_alive(wait=False)
+        response_time = response_data = error = None
+        reused = False
+        try:
+            if prepared is not None and self.session.is_hot(prepared):
+                try:
+                    response = self.session.fire(prepared, self.response_deadline_ns)
+                finally:
+                    self.failed_over = prepared.failed_over
+                reused = True
+            else:
+                if prepared is not None:
+                    self.session.disarm(prepared)
+                url = APPLY_URL
+                headers = {
+                    "Cookie": f"new_bbs_serviceToken={cookie};deviceId={device_id};"
+                }
+                hot = self.session.ensure_warm(url)
+                response = self.session.make_request(
+                    'POST', url, headers=headers,
+                    timeout=self.session.budget(self.response_deadline_ns), retries=False
+                )
+                reused = hot and self.session.last_reused_warm
+            if response is not None:
+                response_time = self.clock.now_ns()
+                response_data = json.loads(response.data.decode('utf-8'))
+                response.release_conn()
+        except Exception as e:
+            error = e
+
+        self.fire_trace = last_trace()
+        request_time = scheduler.fired_ns if scheduler is not None else self.clock.now_ns()
+        self.result = (scheduler, request_time, response_time, response_data, error, reused)
+
+    def wait_for_result(self):
+        while self.scheduler is not None and self.scheduler.running:
+            self.update_display()
+            self.scheduler.join(DISPLAY_INTERVAL)
+        if self.result is None:
+            return False
+        return self.handle_request_result(*self.result)
+
+    def handle_request_result(self, scheduler, request_time, response_time, response_data, error, reused):
+        if scheduler is not None:
+            self.log_message(
+                f"Target time reached! Fired {scheduler.lateness_ns / 1000:.0f} µs after target"
+            )
+        if self.sampler is not None and self.mode == "auto":
+            estimate = self.sampler.estimate()
+            if estimate is not None:
+                self.log_message(f"Latency model at fire time: {estimate.describe()}")
+        if reused and self.failed_over:
+            self.log_message("Warm connection failed on send, prepared request sent once on the standby")
+        elif reused:
+            self.log_message("Prepared request sent on the warm connection")
+        else:
+            self.log_message("Warm connection was not available, request opened a new connection")
+        self.log_trace(self.fire_trace)
+        trace = self.fire_trace
+        if trace is not None:
+            if not trace.sent:
+                reason = trace.error if trace.error is not None else error
+                self.log_message(f"Submit was not sent{f': {reason}' if reason is not None else ''}")
+            elif trace.retries:
+                self.log_message(f"Submit was retried {trace.retries} times by the HTTP layer")
+            else:
+                self.log_message("Submit was sent exactly once, no retries")
+
+        self.save_attempt(scheduler, request_time, response_time, response_data, error)
+
+        try:
+            if error is not None:
+                raise error
+
+            request_at = SyncedClock.to_datetime(request_time)
+            self.log_message(f"Sending request at {request_at.strftime('%H:%M:%S.%f')}")
+            if response_data is None:
+                self.log_message("Failed to send request")
+                self.show_error("Error", "Failed to send request")
+                return False
+
+            response_at = SyncedClock.to_datetime(response_time)
+            self.log_message(f"Response received at {response_at.strftime('%H:%M:%S.%f')}")
+
+            code = response_data.get("code")
+            data = response_data.get("data", {})
+
+            if code == 0:
+                apply_result = data.get("apply_result")
+                if apply_result == 1:
+                    self.log_message("Request approved!")
+                    self.show_info("Success", "Request approved!")
+                    return True
+                elif apply_result == 3:
+                    deadline = data.get("deadline_format", "")
+                    self.log_message(f"Submission limit reached, try again {deadline}")
+                    self.show_info("Info", f"Try again on {deadline}")
+            else:
+                self.log_message(f"Response code: {code}")
+
+        except Exception as e:
+            self.log_message(f"Request error: {e}")
+            self.show_error("Error", f"Error: {e}")
+
+        return False
+
+    def save_attempt(self, scheduler, request_time, response_time, response_data, error):
+        latency = self.fire_latency
+        estimate = self.sampler.estimate() if self.sampler is not None else None
+        if latency is None and estimate is not None:
+            latency = estimate.mean
+        data = (response_data or {}).get("data") or {}
+
+        record = {
+            "mode": self.mode,
+            "model": self.timing_model.to_dict(),
+            "latency_ms": latency,
+            "latency": None if estimate is None else {
+                "mean": estimate.mean,
+                "deviation": estimate.deviation,
+                "median": estimate.median,
+                "p90": estimate.p90,
+                "count": estimate.count,
+            },
+            "script_time": None if scheduler is None else (scheduler.target_ns - self.minute_ns) / 1e9,
+            "fire_second": (request_time - self.minute_ns) / 1e9,
+            "lateness_us": None if scheduler is None else scheduler.lateness_ns / 1000,
+            "response_second": None if response_time is None else (response_time - self.minute_ns) / 1e9,
+            "code": (response_data or {}).get("code"),
+            "apply_result": data.get("apply_result"),
+            "error": None if error is None else str(error),
+        }
+        try:
+            record_attempt(record)
+        except OSError as e:
+            self.log_message(f"Could not record attempt: {e}")
+
+    def start_process(self, cookie, mode, manual_time=None):
+        self.mode = mode
+        self.log_message("\n========== Starting Unlock Process ==========")
+        self.emit("status", "Processing...")
+
+        device_id = self.generate_device_id()
+
+        report = self.preflight(cookie, device_id)
+        if not report["cookie check"].ok:
+            self.emit("status", "Check failed")
+            return False
+
+        self.clock = report["clock sync"].value
+        if self.clock is None:
+            self.show_error("Error", "Failed to synchronize time!")
+            self.emit("status", "Time sync failed")
+            return False
+
+        self.scheduler = None
+        self.warm_up_scheduler = None
+        self.server_clock = None
+        self.model_rejected = False
+        # The next target minute that has not ended yet
+        self.minute_ns = next_daily_ns(self.clock.now_ns(), TARGET_HOUR, TARGET_MINUTE, MINUTE_NS) - MINUTE_NS
+        self.log_message(f"Timing model: {self.timing_model.describe()}")
+        if self.settings['aim_server_clock']:
+            self.estimate_server_clock()
+        self.start_latency_sampler()
+        self.session.keep_alive(STATE_URL)
+        self.log_message("Keeping connections to the API host alive")
+
+        if mode == "auto":
+            self.wait_for_ping_time(cookie, device_id)
+        elif not self.start_manual_mode(cookie, device_id, manual_time):
+            self.sampler.stop()
+            self.session.stop_keep_alive()
+            return False
+
+        return self.wait_for_result()
+
+    def wait_for_ping_time(self, cookie, device_id):
+        self.log_message(f"Waiting for {TARGET_LABEL}:{PING_SECOND} to measure latency...")
+        self.emit("status", "Waiting for ping time...")
+        # Already past it (but before the minute ended) means measuring right away
+        self.wait_until(self.minute_ns + PING_SECOND * SECOND_NS)
+
+        self.log_message(f"{TARGET_LABEL}:{PING_SECOND} reached, measuring latency...")
+        avg_ping = self.current_latency(self.measure_latency())
+        script_time = self.calculate_script_time(avg_ping)
+        if self.server_clock is not None:
+            # fire_target() aims at the arrival second instead; log what is actually scheduled
+            self.log_message(
+                f"Calculated arrival time: {self.arrival_second():.3f}s on the server's clock, "
+                f"sent {avg_ping / 2:.1f} ms earlier (follows the measured latency until 1 s before)"
+            )
+        else:
+            self.log_message(f"Calculated submission time: {script_time:.3f}s (follows the latency model until 1 s before)")
+        self.wait_until_target_time(cookie, device_id, script_time, fallback_ping=avg_ping)
+
+    def start_manual_mode(self, cookie, device_id, manual_time):
+        try:
+            script_time = float(manual_time)
+            if script_time < 58.5 or script_time > 59.8:
+                raise ValueError("Time must be between 58.5 and 59.8")
+
+            self.log_message(f"Manual mode: submission time set to {TARGET_LABEL}:{script_time}")
+            self.emit("status", "Manual mode active")
+            self.wait_until_target_time(cookie, device_id, script_time)
+            return True
+        except ValueError:
+            self.show_error("Error", "Invalid time! Use format: 59.1 (between 58.5 and 59.8)")
+            return False
@@ -0,0 +1,652 @@
+"""
+HTTP/1.1 session for Xiaomi Unlock Tool
+Wraps a urllib3 PoolManager and keeps pre-warmed keep-alive connections ready for the submit
+"""
+
+import http.client
+import ssl
+import threading
+import time
+
+import urllib3
+from urllib3.util.wait import wait_for_read
+
+from tracing import (
+    POOL_CLASSES, RequestTrace, TraceRecorder, TracingHTTPSConnection, TracingHTTPSConnectionPool, traced,
+    set_last_trace,
+)
+
+CONNECT_TIMEOUT = 2.0
+READ_TIMEOUT = 15.0
+# Idempotent requests may be retried a couple of times; POSTs never are unless asked for
+GET_RETRIES = urllib3.Retry(total=2, backoff_factor=0)
+# Floor for a budget that has run out, so the call fails fast instead of blocking
+MIN_TIMEOUT = 0.05
+# Longest wait for the session tickets a TLS 1.3 server sends after a fresh handshake
+TICKET_WAIT = 0.5
+
+
+class PreparedRequest:
+    """A request serialized to bytes ahead of time and fired with one sendall()"""
+
+    def __init__(self, method, url, headers, body):
+        parsed = urllib3.util.parse_url(url)
+        host = parsed.host if parsed.port is None else f"{parsed.host}:{parsed.port}"
+        lines = [f"{method} {parsed.request_uri} HTTP/1.1", f"Host: {host}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        self.method = method
+        self.url = url
+        self.payload = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body or b"")
+        self.pool = None
+        self.conn = None
+        self.sendall = None
+        self.standby = None
+        self.failed_over = False
+        self.sent_ns = None
+
+    @property
+    def armed(self):
+        return self.sendall is not None
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """Client SSLContext that offers each host's last TLS session on every new connection
+
+    Sessions are remembered from connections handed back to the pool, once a
+    response has been read on them (TLS 1.3 tickets only arrive after the
+    handshake), and are dropped when they expire. They last for this run only:
+    the ssl module has no way to save an SSLSession and load it back.
+    """
+
+    def __new__(cls, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        return super().__new__(cls, protocol)
+
+    def __init__(self, protocol=ssl.PROTOCOL_TLS_CLIENT):
+        self.minimum_version = ssl.TLSVersion.TLSv1_2
+        self.load_default_certs()
+        self.offered = 0
+        self.resumed = 0
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self.session_for(server_hostname)
+        ssl_sock = super().wrap_socket(
+            sock,
+            server_side=server_side,
+            do_handshake_on_connect=do_handshake_on_connect,
+            suppress_ragged_eofs=suppress_ragged_eofs,
+            server_hostname=server_hostname,
+            session=session,
+        )
+        if session is not None:
+            self.offered += 1
+            self.resumed += ssl_sock.session_reused
+        return ssl_sock
+
+    def session_for(self, host):
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is not None and session.time + session.timeout <= time.time():
+                del self._sessions[host]
+                session = None
+        return session
+
+    def remember(self, sock):
+        """Keep sock's TLS session for its host, if it can be resumed"""
+        session = getattr(sock, "session", None)
+        if session is None or not (session.has_ticket or session.id):
+            return
+        with self._lock:
+            self._sessions[sock.server_hostname] = session
+
+    def describe(self):
+        return f"TLS sessions resumed on {self.resumed} of {self.offered} reconnects"
+
+
+def remember_session(conn):
+    context = getattr(conn, "ssl_context", None)
+    if isinstance(context, ResumingSSLContext) and conn.sock is not None:
+        context.remember(conn.sock)
+
+
+def connection_alive(conn):
+    """True if conn is open and idle, with nothing left to read on its socket
+
+    urllib3's is_connected counts any readable socket as dropped, but a TLS 1.3
+    connection stays readable until the session tickets the server sends after
+    the handshake have been read. Those are consumed here with a non-blocking
+    read: SSLWantReadError means only TLS records were pending and the
+    connection is alive, b"" means the server closed it, and data means it is
+    stale.
+    """
+    sock = conn.sock
+    if sock is None:
+        return False
+    if not wait_for_read(sock, timeout=0.0):
+        return True
+    if not isinstance(sock, ssl.SSLSocket):
+        return False
+    timeout = sock.gettimeout()
+    try:
+        sock.settimeout(0.0)
+        sock.recv(1)
+    except ssl.SSLWantReadError:
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.settimeout(timeout)
+    return False
+
+
+def settle(conn, wait=TICKET_WAIT):
+    """Finish setting up a freshly connected conn; True if it is verified and alive
+
+    On TLS 1.3 this waits up to wait seconds for the server's session tickets
+    and reads them, so the parked socket is not mistaken for a dropped one.
+    """
+    sock = conn.sock
+    if isinstance(sock, ssl.SSLSocket):
+        if not conn.is_verified:
+            return False
+        if sock.version() == "TLSv1.3":
+            wait_for_read(sock, timeout=wait)
+    return connection_alive(conn)
+
+
+class LivenessHTTPSConnection(TracingHTTPSConnection):
+    """HTTPS connection whose is_connected uses connection_alive()
+
+    urllib3 checks is_connected on every checkout from the pool and silently
+    replaces a connection it reports as dropped. A TLS 1.3 server may send its
+    second session ticket after settle() has returned, so without this the
+    warm connection could be thrown away at the moment it is needed.
+    """
+
+    @property
+    def is_connected(self):
+        return connection_alive(self)
+
+
+class ResumingHTTPSConnectionPool(TracingHTTPSConnectionPool):
+    ConnectionCls = LivenessHTTPSConnection
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            remember_session(conn)
+        super()._put_conn(conn)
+
+
+class HTTP11Session:
+    def __init__(self):
+        self.ssl_context = ResumingSSLContext()
+        self.http = urllib3.PoolManager(
+            maxsize=10,
+            retries=GET_RETRIES,
+            timeout=urllib3.Timeout(connect=CONNECT_TIMEOUT, read=READ_TIMEOUT),
+            ssl_context=self.ssl_context,
+            headers={}
+        )
+        self.http.pool_classes_by_scheme = dict(POOL_CLASSES, https=ResumingHTTPSConnectionPool)
+        self.tracer = TraceRecorder()
+        self.warm_sock = None
+        self.last_reused_warm = False
+        self.keeper = None
+
+    def warm_up(self, url):
+        """Open a verified keep-alive connection to url's host and park it in the pool
+
+        Returns the time the DNS, TCP and TLS setup took in seconds, or None on failure.
+        """
+        pool = self.http.connection_from_url(url)
+        conn = pool._get_conn()
+        try:
+            started = time.perf_counter()
+            alive = connection_alive(conn)
+            if not alive:
+                conn.close()
+                with traced("CONNECT", url, self.tracer):
+                    conn.connect()
+            elapsed = time.perf_counter() - started
+            if not alive and not settle(conn):
+                raise ConnectionError("connection is not usable")
+        except Exception:
+            conn.close()
+            self.warm_sock = None
+            pool._put_conn(conn)
+            return None
+
+        self.warm_sock = conn.sock
+        pool._put_conn(conn)
+        return elapsed
+
+    def ensure_warm(self, url):
+        """Check the parked connection is still live, reconnecting if it was dropped
+
+        Returns True if the warm socket survived untouched.
+        """
+        pool = self.http.connection_from_url(url)
+        conn = pool._get_conn()
+        alive = conn.sock is not None and conn.sock is self.warm_sock and connection_alive(conn)
+        pool._put_conn(conn)
+        if not alive:
+            self.warm_up(url)
+        return alive
+
+    def build_request(self, method, headers=None, body=None):
+        request_headers = {}
+        if headers:
+            request_headers.update(headers)
+            request_headers['Content-Type'] = 'application/json; charset=utf-8'
+
+        if method == 'POST':
+            if body is None:
+                body = '{"is_retry":true}'.encode('utf-8')
+            request_headers['Content-Length'] = str(len(body))
+            request_headers['Accept-Encoding'] = 'gzip, deflate, br'
+            request_headers['User-Agent'] = 'okhttp/4.12.0'
+            request_headers['Connection'] = 'keep-alive'
+
+        return request_headers, body
+
+    @staticmethod
+    def time_left(deadline_ns):
+        """Seconds until deadline_ns on the perf_counter_ns clock, never below MIN_TIMEOUT"""
+        return max((deadline_ns - time.perf_counter_ns()) / 1e9, MIN_TIMEOUT)
+
+    def budget(self, deadline_ns):
+        """A Timeout that ends an attempt by deadline_ns (perf_counter_ns clock)
+
+        Each retry gets the same budget again, so use it with retries=False to
+        bound the whole call.
+        """
+        left = self.time_left(deadline_ns)
+        return urllib3.Timeout(total=left, connect=min(CONNECT_TIMEOUT, left), read=min(READ_TIMEOUT, left))
+
+    def make_request(self, method, url, headers=None, body=None, timeout=None, retries=None):
+        """Send a request and return the response, or None on failure
+
+        timeout defaults to the pool's; retries defaults to GET_RETRIES for GET
+        and to no retries at all for anything else. The number of retries the
+        request needed is recorded on its trace. The body is read
+        before returning so the trace covers the download; response.data still
+        works afterwards.
+        """
+        if retries is None:
+            retries = GET_RETRIES if method == 'GET' else False
+        options = {"retries": retries}
+        if timeout is not None:
+            options["timeout"] = timeout
+        try:
+            with traced(method, url, self.tracer) as trace:
+                request_headers, body = self.build_request(method, headers, body)
+
+                response = self.http.request(
+                    method,
+                    url,
+                    headers=request_headers,
+                    body=body,
+                    preload_content=False,
+                    **options
+                )
+                history = response.retries.history if response.retries else ()
+                trace.retries = len(history)
+                conn = getattr(response, "connection", None)
+                self.last_reused_warm = (
+                    self.warm_sock is not None and conn is not None and conn.sock is self.warm_sock
+                )
+                with trace.span("download"):
+                    response.data
+            return response
+        except Exception:
+            return None
+
+    def prepare(self, method, url, headers=None, body=None):
+        request_headers, body = self.build_request(method, headers, body)
+        return PreparedRequest(method, url, request_headers, body)
+
+    def arm(self, prepared):
+        """Check a live connection out of the pool and bind the prepared request to its socket
+
+        The connection stays checked out until the request is fired or disarmed.
+        """
+        self.disarm(prepared)
+        pool = self.http.connection_from_url(prepared.url)
+        conn = pool._get_conn()
+        try:
+            if not connection_alive(conn):
+                conn.close()
+                conn.connect()
+                if not settle(conn):
+                    raise ConnectionError("connection is not usable")
+        except Exception:
+            conn.close()
+            pool._put_conn(conn)
+            return False
+
+        prepared.pool = pool
+        prepared.conn = conn
+        prepared.sendall = conn.sock.sendall
+        return True
+
+    def keep_alive(self, url, size=2):
+        """Start holding size live connections to url's host; see ConnectionKeeper"""
+        self.stop_keep_alive()
+        self.keeper = ConnectionKeeper(self, url, size).start()
+        return self.keeper
+
+    def stop_keep_alive(self, wait=True):
+        """Stop the heartbeats and hand the held connections back to the pool; see ConnectionKeeper.stop"""
+        keeper, self.keeper = self.keeper, None
+        if keeper is not None:
+            keeper.stop(wait)
+        return keeper
+
+    def arm_kept(self, prepared):
+        """Arm prepared on a connection the keeper has just proven alive
+
+        Returns False if there is no keeper for that host or no live connection.
+        """
+        self.disarm(prepared)
+        pool = self.http.connection_from_url(prepared.url)
+        # Read once: another thread may stop the keeper meanwhile
+        keeper = self.keeper
+        if keeper is None or keeper.pool is not pool:
+            return False
+        conn = keeper.take()
+        if conn is None:
+            return False
+
+        self.warm_sock = conn.sock
+        prepared.pool = pool
+        prepared.conn = conn
+        prepared.sendall = conn.sock.sendall
+        return True
+
+    def arm_standby(self, prepared):
+        """Check out a second live connection for prepared to fall back on
+
+        It comes from the keeper if one is running for that host, otherwise it
+        is set up separately from the primary. Returns False if there is none.
+        """
+        if not prepared.armed:
+            return False
+        self.drop_standby(prepared)
+        conn = None
+        keeper = self.keeper
+        if keeper is not None and keeper.pool is prepared.pool:
+            conn = keeper.take()
+        if conn is None:
+            conn = prepared.pool._get_conn()
+            try:
+                if not connection_alive(conn):
+                    conn.close()
+                    with traced("CONNECT", prepared.url, self.tracer):
+                        conn.connect()
+                    if not settle(conn):
+                        raise ConnectionError("connection is not usable")
+            except Exception:
+                conn.close()
+                prepared.pool._put_conn(conn)
+                return False
+        prepared.standby = conn
+        return True
+
+    def drop_standby(self, prepared):
+        if prepared.standby is not None:
+            prepared.pool._put_conn(prepared.standby)
+        prepared.standby = None
+
+    def disarm(self, prepared):
+        self.drop_standby(prepared)
+        if prepared.conn is not None:
+            prepared.pool._put_conn(prepared.conn)
+        prepared.pool = prepared.conn = prepared.sendall = None
+
+    def is_hot(self, prepared):
+        """Check the armed connections right before the fire
+
+        A primary that has died is swapped for the standby, and a dead standby
+        is dropped, so fire() never starts on a connection known to be gone.
+        """
+        if not prepared.armed:
+            return False
+        if prepared.standby is not None and not connection_alive(prepared.standby):
+            prepared.standby.close()
+            self.drop_standby(prepared)
+        alive = connection_alive(prepared.conn)
+        if not alive and prepared.standby is not None:
+            self._promote_standby(prepared)
+            alive = True
+        return alive
+
+    def _promote_standby(self, prepared):
+        dead, prepared.conn, prepared.standby = prepared.conn, prepared.standby, None
+        dead.close()
+        prepared.pool._put_conn(dead)
+        prepared.sendall = prepared.conn.sock.sendall
+        self.warm_sock = prepared.conn.sock
+
+    def fire(self, prepared, deadline_ns=None):
+        """Send the prepared bytes on the armed socket and return the response
+
+        Nothing is built or formatted before the sendall(); the response is read
+        afterwards into a regular urllib3 response, which returns the connection
+        to the pool once its body has been read. deadline_ns (perf_counter_ns)
+        bounds the wait for the response; the request itself is never resent.
+
+        If the sendall() on the primary raises, the server cannot have received
+        the complete request, so the same bytes go out once on the standby.
+        Once a sendall() has returned, nothing is sent again, whatever happens.
+        """
+        send_ns = time.perf_counter_ns()
+        failed_ns = None
+        trace = RequestTrace(prepared.method, prepared.url)
+        trace.started_ns = send_ns
+        self.tracer.add(trace)
+        set_last_trace(trace)
+        try:
+            try:
+                prepared.sendall(prepared.payload)
+            except OSError:
+                if prepared.standby is None:
+                    raise
+                failed_ns = time.perf_counter_ns()
+                trace.add("send failed", send_ns, failed_ns)
+                self._promote_standby(prepared)
+                prepared.failed_over = True
+                prepared.sendall(prepared.payload)
+        except Exception as e:
+            if failed_ns is None:
+                trace.add("send failed", send_ns, time.perf_counter_ns())
+            else:
+                trace.add("send on standby failed", failed_ns, time.perf_counter_ns())
+            trace.finish(e)
+            prepared.conn.close()
+            self.disarm(prepared)
+            raise
+        prepared.sent_ns = time.perf_counter_ns()
+
+        if failed_ns is None:
+            trace.add("send", send_ns, prepared.sent_ns)
+        else:
+            trace.add("send on standby", failed_ns, prepared.sent_ns)
+
+        self.drop_standby(prepared)
+        pool, conn = prepared.pool, prepared.conn
+        prepared.pool = prepared.conn = prepared.sendall = None
+        try:
+            if deadline_ns is not None:
+                conn.sock.settimeout(self.time_left(deadline_ns))
+            with trace.span("wait"):
+                raw = http.client.HTTPResponse(conn.sock, method=prepared.method)
+                raw.begin()
+        except Exception as e:
+            trace.finish(e)
+            conn.close()
+            pool._put_conn(conn)
+            raise
+
+        response = urllib3.HTTPResponse(
+            body=raw,
+            headers=urllib3.HTTPHeaderDict(raw.msg.items()),
+            status=raw.status,
+            version=raw.version,
+            reason=raw.reason,
+            preload_content=False,
+            decode_content=True,
+            original_response=raw,
+            pool=pool,
+            connection=conn,
+            request_method=prepared.method,
+            request_url=prepared.url,
+        )
+        with trace.span("download"):
+            response.data
+        trace.finish()
+        return response
+
+
+class ConnectionKeeper:
+    """Holds a few live connections to one host and keeps them from going idle
+
+    Each held connection gets a light GET (the heartbeat) once it has been idle
+    for the current interval, and one straight after it is (re)connected, which
+    proves it works and reads any TLS 1.3 session tickets. A connection whose
+    last heartbeat succeeded but which died while idle is rebuilt and the
+    interval is halved, since something on the path drops idle connections
+    sooner than assumed; every successful idle heartbeat lets it grow again, up
+    to half of any Keep-Alive timeout the server announces.
+    """
+
+    def __init__(self, session, url, size=2, interval=15.0, min_interval=2.0, max_interval=45.0,
+                 timeout=2.0):
+        self.session = session
+        self.url = url
+        self.pool = session.http.connection_from_url(url)
+        self.path = urllib3.util.parse_url(url).request_uri
+        self.size = size
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.heartbeats = 0
+        self.rebuilt = 0
+        self._idle = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="connection-keeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        """Stop the heartbeats; the keeper thread hands its connections back to the pool as it exits
+
+        With wait=False this returns at once instead of waiting for a heartbeat in flight.
+        """
+        self._stopped.set()
+        if wait:
+            self._thread.join(self.timeout + 1)
+
+    def describe(self):
+        return (
+            f"{self.heartbeats} heartbeats, {self.rebuilt} dropped connections rebuilt, "
+            f"interval {self.interval:.1f} s"
+        )
+
+    def take(self, max_idle=1.0):
+        """Check out the most recently proven connection, or None if none is live
+
+        A connection idle for longer than max_idle seconds gets one more
+        heartbeat first, so what is returned has just been shown to work.
+        """
+        with self._lock:
+            if not self._idle:
+                return None
+            self._idle.sort(key=lambda item: (item[2], item[1]))
+            conn, checked, proven = self._idle.pop()
+        if proven and time.perf_counter() - checked <= max_idle and connection_alive(conn):
+            return conn
+        if (connection_alive(conn) and self._beat(conn)) or self._rebuild(conn):
+            return conn
+        self.pool._put_conn(conn)
+        return None
+
+    def _beat(self, conn):
+        try:
+            conn.sock.settimeout(self.timeout)
+            with traced("GET", self.url, self.session.tracer):
+                conn.request("GET", self.path, headers={"Connection": "keep-alive"})
+                response = conn.getresponse()
+                response.data
+        except Exception:
+            conn.close()
+            return False
+
+        if response.headers.get("Connection", "").lower() == "close":
+            conn.close()
+            return False
+        self.heartbeats += 1
+        remember_session(conn)
+        for part in response.headers.get("Keep-Alive", "").split(","):
+            name, _, value = part.strip().partition("=")
+            if name.lower() == "timeout" and value.isdigit():
+                self.max_interval = max(self.min_interval, min(self.max_interval, int(value) / 2))
+                self.interval = min(self.interval, self.max_interval)
+        return True
+
+    def _rebuild(self, conn):
+        conn.close()
+        try:
+            with traced("CONNECT", self.url, self.session.tracer):
+                conn.connect()
+        except Exception:
+            conn.close()
+            return False
+        return settle(conn)
+
+    def _due(self, item, now):
+        # Proven connections wait out the interval; broken ones are retried sooner
+        _, checked, proven = item
+        return checked + (self.interval if proven else self.min_interval) - now
+
+    def _run(self):
+        while not self._stopped.is_set():
+            now = time.perf_counter()
+            with self._lock:
+                while len(self._idle) < self.size:
+                    self._idle.append((self.pool._get_conn(), 0.0, False))
+                due = [item for item in self._idle if self._due(item, now) <= 0]
+                self._idle = [item for item in self._idle if self._due(item, now) > 0]
+
+            for conn, checked, was_proven in due:
+                if self._stopped.is_set():
+                    # No heartbeat may start after stop(); hand it back as it is
+                    with self._lock:
+                        self._idle.append((conn, checked, was_proven))
+                    continue
+                if connection_alive(conn) and self._beat(conn):
+                    self.interval = min(self.max_interval, self.interval * 1.25)
+                    proven = True
+                else:
+                    if was_proven:
+                        # It was fine at the last heartbeat and died while idle
+                        self.interval = max(self.min_interval, self.interval / 2)
+                        self.rebuilt += 1
+                    proven = self._rebuild(conn) and self._beat(conn)
+                with self._lock:
+                    self._idle.append((conn, time.perf_counter(), proven))
+
+            with self._lock:
+                wait = min((self._due(item, time.perf_counter()) for item in self._idle), default=1.0)
+            self._stopped.wait(min(max(wait, 0.05), 1.0))
+
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _, _ in idle:
+            self.pool._put_conn(conn)
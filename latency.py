@@ -0,0 +1,217 @@
+"""
+Latency measurement for Xiaomi Unlock Tool
+Probes the API host with TCP connects and HTTP round trips over the warm connection
+"""
+
+import asyncio
+import math
+import socket
+import statistics
+import threading
+import time
+from collections import deque
+
+from icmplib import async_ping
+from urllib3.util import parse_url
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class LatencyStats:
+    """Summary of round-trip samples in milliseconds"""
+
+    def __init__(self, samples):
+        self.samples = list(samples)
+        self.median = statistics.median(self.samples)
+        self.p90 = percentile(self.samples, 0.9)
+        # Mean difference between consecutive samples, as in RFC 3550
+        if len(self.samples) > 1:
+            self.jitter = statistics.mean(
+                abs(b - a) for a, b in zip(self.samples, self.samples[1:])
+            )
+        else:
+            self.jitter = 0.0
+
+    def describe(self):
+        return (
+            f"median {self.median:.1f} ms, p90 {self.p90:.1f} ms, "
+            f"jitter {self.jitter:.1f} ms ({len(self.samples)} samples)"
+        )
+
+
+class LatencyProbe:
+    """Measures TCP connect time and HTTP round-trip time to the host serving url"""
+
+    def __init__(self, session, url, samples=10, budget=3.0, timeout=2.0):
+        self.session = session
+        self.url = url
+        self.samples = samples
+        self.budget = budget
+        self.timeout = timeout
+        parsed = parse_url(url)
+        self.host = parsed.host
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.address = None
+
+    def resolve(self):
+        family, kind, proto, _, address = socket.getaddrinfo(
+            self.host, self.port, type=socket.SOCK_STREAM
+        )[0]
+        self.address = (family, kind, proto, address)
+        return address[0]
+
+    def measure_connect(self):
+        family, kind, proto, address = self.address
+        sock = socket.socket(family, kind, proto)
+        sock.settimeout(self.timeout)
+        try:
+            started = time.perf_counter()
+            sock.connect(address)
+            return (time.perf_counter() - started) * 1000
+        finally:
+            sock.close()
+
+    def measure_http(self):
+        started = time.perf_counter()
+        response = self.session.make_request('GET', self.url)
+        if response is None:
+            raise ConnectionError("no response")
+        elapsed = (time.perf_counter() - started) * 1000
+        response.data
+        response.release_conn()
+        return elapsed
+
+    def run(self):
+        """Return (connect_stats, http_stats); either is None if no sample succeeded"""
+        connect_samples = []
+        http_samples = []
+        deadline = time.perf_counter() + self.budget
+
+        if self.address is None:
+            self.resolve()
+        self.session.warm_up(self.url)
+
+        for _ in range(self.samples):
+            if time.perf_counter() >= deadline:
+                break
+            try:
+                connect_samples.append(self.measure_connect())
+            except OSError:
+                pass
+            try:
+                http_samples.append(self.measure_http())
+            except Exception:
+                pass
+
+        return (
+            LatencyStats(connect_samples) if connect_samples else None,
+            LatencyStats(http_samples) if http_samples else None,
+        )
+
+
+class LatencyEstimate:
+    """Snapshot of the sampler's model, all values in milliseconds"""
+
+    def __init__(self, mean, deviation, recent, count):
+        self.mean = mean
+        self.deviation = deviation
+        self.count = count
+        self.median = statistics.median(recent)
+        self.p90 = percentile(recent, 0.9)
+
+    def describe(self):
+        return (
+            f"ewma {self.mean:.1f} ± {self.deviation:.1f} ms, "
+            f"median {self.median:.1f} ms, p90 {self.p90:.1f} ms ({self.count} samples)"
+        )
+
+
+class LatencySampler:
+    """Keeps sampling HTTP round trips in the background while the tool waits
+
+    Maintains an exponentially weighted mean and variance plus a window of
+    recent samples, so the timing calculation can read a fresh estimate at
+    the last moment instead of a single snapshot.
+    """
+
+    ALPHA = 0.125
+
+    def __init__(self, probe, interval=2.0, window=30):
+        self.probe = probe
+        self.interval = interval
+        self.recent = deque(maxlen=window)
+        self.mean = None
+        self.variance = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="latency-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def add(self, rtt):
+        with self._lock:
+            if self.mean is None:
+                self.mean = rtt
+                self.variance = (rtt / 2) ** 2
+            else:
+                diff = rtt - self.mean
+                increment = self.ALPHA * diff
+                self.mean += increment
+                self.variance = (1 - self.ALPHA) * (self.variance + diff * increment)
+            self.recent.append(rtt)
+            self.count += 1
+
+    def estimate(self):
+        with self._lock:
+            if self.mean is None:
+                return None
+            return LatencyEstimate(self.mean, math.sqrt(self.variance), list(self.recent), self.count)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.add(self.probe.measure_http())
+            except Exception:
+                pass
+            self._stopped.wait(self.interval)
+
+
+def icmp_probe(hosts, count=5, interval=0.05, deadline=1.5):
+    """Ping all hosts at once and return {host: icmplib Host or exception}
+
+    The per-reply timeout is sized so a dead host gives up within the deadline;
+    anything still running when it expires is cancelled and reported as a TimeoutError.
+    """
+    return asyncio.run(_icmp_probe(hosts, count, interval, deadline))
+
+
+async def _icmp_probe(hosts, count, interval, deadline):
+    timeout = max(0.1, (deadline - (count - 1) * interval) / count)
+    tasks = {
+        asyncio.ensure_future(async_ping(host, count=count, interval=interval, timeout=timeout)): host
+        for host in hosts
+    }
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+    results = {}
+    for task in pending:
+        task.cancel()
+        results[tasks[task]] = TimeoutError(f"no result within {deadline:.1f} s")
+    for task in done:
+        try:
+            results[tasks[task]] = task.result()
+        except Exception as e:
+            results[tasks[task]] = e
+    if pending:
+        await asyncio.wait(pending)
+    return results
@@ -0,0 +1,91 @@
+"""
+Log sink for Xiaomi Unlock Tool
+Buffers log lines for batched display and writes them to a JSONL file on a background thread
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from timing_model import DATA_DIR
+
+LOG_PATH = os.path.join(DATA_DIR, "log.jsonl")
+
+
+class LogSink:
+    """Thread-safe log buffer
+
+    write() only appends to a bounded ring buffer and a queue, so it is cheap
+    on any thread. The GUI takes formatted lines with drain() at its own pace;
+    a writer thread appends every record to path as JSON with the monotonic
+    perf_counter_ns timestamp the scheduler uses. If the GUI falls behind by
+    more than capacity lines, the oldest ones are dropped from the display only.
+    """
+
+    def __init__(self, path=LOG_PATH, capacity=2000):
+        self.path = path
+        self.pending = deque(maxlen=capacity)
+        self._records = queue.SimpleQueue()
+        self._thread = None
+        if path is not None:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def write(self, message):
+        wall = time.time()
+        self.pending.append((wall, message))
+        if self._thread is not None:
+            self._records.put((time.perf_counter_ns(), wall, threading.current_thread().name, message))
+
+    def drain(self):
+        """Return the lines written since the last call, each prefixed with [HH:MM:SS]"""
+        lines = []
+        while True:
+            try:
+                wall, message = self.pending.popleft()
+            except IndexError:
+                return lines
+            lines.append(f"{datetime.fromtimestamp(wall).strftime('[%H:%M:%S]')} {message}")
+
+    def close(self, timeout=1.0):
+        if self._thread is not None:
+            self._records.put(None)
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            f = open(self.path, "a", encoding="utf-8")
+        except OSError:
+            # No log file; keep draining so the queue does not grow
+            f = None
+
+        while True:
+            batch = [self._records.get()]
+            while True:
+                try:
+                    batch.append(self._records.get_nowait())
+                except queue.Empty:
+                    break
+
+            closing = None in batch
+            if f is not None:
+                for record in batch:
+                    if record is None:
+                        continue
+                    mono_ns, wall, thread, message = record
+                    f.write(json.dumps({
+                        "mono_ns": mono_ns,
+                        "time": wall,
+                        "thread": thread,
+                        "message": message,
+                    }) + "\n")
+                f.flush()
+            if closing:
+                if f is not None:
+                    f.close()
+                return
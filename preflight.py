@@ -0,0 +1,67 @@
+"""
+Preflight stage for Xiaomi Unlock Tool
+Runs the independent setup steps at the same time and times each of them
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StepResult:
+    """Outcome of one preflight step: its return value or the exception it raised"""
+
+    def __init__(self, name, value=None, error=None, elapsed=0.0):
+        self.name = name
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None and self.value is not None and self.value is not False
+
+    def describe(self):
+        text = f"{self.name} {self.elapsed * 1000:.0f} ms"
+        if self.error is not None:
+            return f"{text} (error: {self.error})"
+        return text if self.ok else f"{text} (failed)"
+
+
+class PreflightReport:
+    """All step results, in the order the steps were given"""
+
+    def __init__(self, results, elapsed):
+        self.results = results
+        self.elapsed = elapsed
+
+    def __getitem__(self, name):
+        return next(result for result in self.results if result.name == name)
+
+    @property
+    def ok(self):
+        return all(result.ok for result in self.results)
+
+    def describe(self):
+        steps = ", ".join(result.describe() for result in self.results)
+        return f"{self.elapsed * 1000:.0f} ms total: {steps}"
+
+
+def _timed(name, step):
+    started = time.perf_counter()
+    try:
+        value, error = step(), None
+    except Exception as e:
+        value, error = None, e
+    return StepResult(name, value, error, time.perf_counter() - started)
+
+
+def run_preflight(steps):
+    """Run each (name, callable) pair on its own worker and wait for all of them
+
+    The stage takes as long as its slowest step rather than the sum of them.
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="preflight") as pool:
+        futures = [pool.submit(_timed, name, step) for name, step in steps]
+        results = [future.result() for future in futures]
+    return PreflightReport(results, time.perf_counter() - started)
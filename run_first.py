@@ -2,14 +2,32 @@
 """
 Setup script for Xiaomi Unlock Tool
 Creates virtual environment, installs dependencies, and runs the application
+
+The venv is only (re)built when the dependency set changes: a hash of it is
+stored in the venv after a successful install. If a "wheelhouse" directory
+exists, packages are installed from it without touching the network; fill it with
+    pip download -d wheelhouse customtkinter ntplib urllib3 icmplib requests
 """
 
+import hashlib
 import subprocess
 import sys
 import os
 import platform
 import venv
 
+VENV_NAME = "venv"
+WHEELHOUSE = "wheelhouse"
+STAMP_NAME = ".deps-hash"
+
+REQUIREMENTS = [
+    "customtkinter",
+    "ntplib",
+    "urllib3",
+    "icmplib",
+    "requests",
+]
+
 def run_command(command, shell=False, check=True):
     """Execute a command and return the result"""
     try:
@@ -25,100 +43,84 @@ def run_command(command, shell=False, check=True):
         print(f"Error running command: {e}")
         return False
 
+def deps_hash():
+    """Hash of everything that decides whether the venv's packages are still right"""
+    key = "\n".join([sys.version, platform.platform()] + sorted(REQUIREMENTS))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def read_stamp(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
 def main():
+    system = platform.system()
+    
+    # Determine the venv python path based on OS
+    if system == "Windows":
+        python_executable = os.path.join(VENV_NAME, "Scripts", "python.exe")
+    else:  # Linux, macOS, etc.
+        python_executable = os.path.join(VENV_NAME, "bin", "python")
+    stamp_path = os.path.join(VENV_NAME, STAMP_NAME)
+    expected = deps_hash()
+    
+    if os.path.exists(python_executable) and read_stamp(stamp_path) == expected:
+        return launch(system, python_executable)
+    
     print("=" * 60)
     print("Xiaomi Unlock Tool - Setup")
     print("=" * 60)
     print()
-    
-    # Detect OS
-    system = platform.system()
     print(f"Detected OS: {system}")
     print()
     
     # Step 1: Create virtual environment
-    venv_name = "venv"
-    print(f"[1/4] Creating virtual environment '{venv_name}'...")
-    
-    try:
-        venv.create(venv_name, with_pip=True)
-        print("✓ Virtual environment created successfully")
-    except Exception as e:
-        print(f"✗ Failed to create virtual environment: {e}")
-        return False
-    
-    print()
-    
-    # Determine activation command and pip path based on OS
-    if system == "Windows":
-        activate_script = os.path.join(venv_name, "Scripts", "activate.bat")
-        pip_executable = os.path.join(venv_name, "Scripts", "pip.exe")
-        python_executable = os.path.join(venv_name, "Scripts", "python.exe")
-    else:  # Linux, macOS, etc.
-        activate_script = os.path.join(venv_name, "bin", "activate")
-        pip_executable = os.path.join(venv_name, "bin", "pip")
-        python_executable = os.path.join(venv_name, "bin", "python")
-    
-    # Step 2: Upgrade pip
-    print("[2/4] Upgrading pip...")
-    if system == "Windows":
-        success = run_command([pip_executable, "install", "--upgrade", "pip"], check=False)
+    if os.path.exists(python_executable):
+        print(f"[1/3] Reusing virtual environment '{VENV_NAME}'")
     else:
-        success = run_command([pip_executable, "install", "--upgrade", "pip"], check=False)
-    
-    if success:
-        print("✓ Pip upgraded successfully")
-    else:
-        print("⚠ Pip upgrade had issues, continuing anyway...")
+        print(f"[1/3] Creating virtual environment '{VENV_NAME}'...")
+        try:
+            venv.create(VENV_NAME, with_pip=True)
+            print("✓ Virtual environment created successfully")
+        except Exception as e:
+            print(f"✗ Failed to create virtual environment: {e}")
+            return False
     
     print()
     
-    # Step 3: Install requirements
-    print("[3/4] Installing dependencies...")
-    
-    requirements = [
-        "customtkinter",
-        "ntplib",
-        "pytz",
-        "urllib3",
-        "icmplib",
-        "requests",
-    ]
-    
-    all_installed = True
-    for requirement in requirements:
-        print(f"  Installing {requirement}...", end=" ", flush=True)
-        if run_command([pip_executable, "install", requirement], check=False):
-            print("✓")
-        else:
-            print("✗")
-            all_installed = False
+    # Step 2: Install requirements, all in one resolver run
+    command = [python_executable, "-m", "pip", "install", "--disable-pip-version-check"]
+    if os.path.isdir(WHEELHOUSE):
+        print(f"[2/3] Installing dependencies from '{WHEELHOUSE}' (offline)...")
+        command += ["--no-index", "--find-links", WHEELHOUSE]
+    else:
+        print("[2/3] Installing dependencies...")
     
-    if all_installed:
+    if run_command(command + REQUIREMENTS, check=False):
+        with open(stamp_path, "w", encoding="utf-8") as f:
+            f.write(expected + "\n")
         print("✓ All dependencies installed successfully")
     else:
         print("⚠ Some dependencies failed to install. This may cause issues.")
     
     print()
     
-    # Step 4: Run the application
-    print("[4/4] Launching Xiaomi Unlock Tool...")
+    # Step 3: Run the application
+    print("[3/3] Launching Xiaomi Unlock Tool...")
     print()
-    print("-" * 60)
-    print()
-    
-    if system == "Windows":
-        # On Windows, use the python executable from venv
-        run_command([python_executable, "app.py"])
-    else:
-        # On Unix-like systems
-        run_command([python_executable, "app.py"])
-    
-    print()
-    print("-" * 60)
-    print()
-    print("Application closed. Thank you for using Xiaomi Unlock Tool!")
-    
+    return launch(system, python_executable)
+
+def launch(system, python_executable):
+    args = [python_executable, "app.py"] + sys.argv[1:]
+    if system != "Windows":
+        # Replace this process so a warm start costs nothing beyond app.py itself
+        sys.stdout.flush()
+        os.execv(python_executable, args)
+    
+    # On Windows exec spawns a detached process, so wait for the app instead
+    run_command(args, check=False)
     return True
 
 if __name__ == "__main__":
@@ -130,4 +132,4 @@ if __name__ == "__main__":
         sys.exit(1)
     except Exception as e:
         print(f"\nFatal error: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
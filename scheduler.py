@@ -0,0 +1,86 @@
+"""
+Fire scheduler for Xiaomi Unlock Tool
+Waits for a target instant on its own thread instead of the Tk event loop
+"""
+
+import sys
+import threading
+import time
+
+# Coarse sleeps stop this long before the target; the rest is a busy-wait
+SPIN_WINDOW_NS = 3_000_000
+# Longest single coarse sleep, so cancel() is noticed quickly
+MAX_SLEEP_NS = 50_000_000
+# How long before the target a refreshable target stops moving
+FREEZE_NS = 1_000_000_000
+# GIL switch interval while spinning, so other threads hand the GIL back quickly
+SPIN_SWITCH_INTERVAL = 0.0001
+
+
+class FireScheduler:
+    """Call callback(scheduler) on a private thread at clock time target_ns
+
+    The thread sleeps until SPIN_WINDOW_NS before the target, then spins on the
+    monotonic clock. The gap between the intended and the actual fire instant
+    is kept in lateness_ns. If refresh is given it is called on every coarse
+    sleep to recompute the target, until freeze_ns before the target.
+    """
+
+    def __init__(self, clock, target_ns, callback, spin_ns=SPIN_WINDOW_NS, name="fire-scheduler",
+                 refresh=None, freeze_ns=FREEZE_NS):
+        self.clock = clock
+        self.target_ns = target_ns
+        self.callback = callback
+        self.spin_ns = spin_ns
+        self.refresh = refresh
+        self.freeze_ns = freeze_ns
+        self.fired_ns = None
+        self.lateness_ns = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def _run(self):
+        perf_counter_ns = time.perf_counter_ns
+        deadline = self.clock.to_mono_ns(self.target_ns)
+
+        while True:
+            if self.refresh is not None:
+                if deadline - perf_counter_ns() > self.freeze_ns:
+                    self.target_ns = self.refresh()
+                    deadline = self.clock.to_mono_ns(self.target_ns)
+                else:
+                    self.refresh = None
+            remaining = deadline - perf_counter_ns() - self.spin_ns
+            if remaining <= 0:
+                break
+            if self._cancelled.wait(min(remaining, MAX_SLEEP_NS) / 1e9):
+                return
+
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(SPIN_SWITCH_INTERVAL)
+        try:
+            while perf_counter_ns() < deadline:
+                pass
+            fired = perf_counter_ns()
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        if self._cancelled.is_set():
+            return
+        self.lateness_ns = fired - deadline
+        self.fired_ns = self.target_ns + self.lateness_ns
+        self.callback(self)
@@ -0,0 +1,109 @@
+"""
+Server clock estimation for Xiaomi Unlock Tool
+Works out the offset of the API server's clock from the one-second Date headers it returns
+"""
+
+import random
+import statistics
+import time
+from email.utils import mktime_tz, parsedate_tz
+
+from timesync import BEIJING_OFFSET_NS, SECOND_NS, marzullo
+
+
+class DateSample:
+    """Server offset interval implied by one response, in ns
+
+    A response dated D that was sent at s and received at r (synchronized clock)
+    was stamped at some local instant in [s, r] while the server read [D, D + 1s),
+    so the server offset lies in (D - r, D + 1s - s).
+    """
+
+    def __init__(self, sent_ns, received_ns, date_ns):
+        self.sent_ns = sent_ns
+        self.received_ns = received_ns
+        self.date_ns = date_ns
+        self.lower = date_ns - received_ns
+        self.upper = date_ns + SECOND_NS - sent_ns
+
+    @property
+    def round_trip_ns(self):
+        return self.received_ns - self.sent_ns
+
+
+class ServerClockEstimate:
+    """Offset of the server clock from the synchronized clock, with its error bound"""
+
+    def __init__(self, offset_ns, error_ns, one_way_ns, samples, agreeing):
+        self.offset_ns = offset_ns
+        self.error_ns = error_ns
+        self.one_way_ns = one_way_ns
+        self.samples = samples
+        self.agreeing = agreeing
+
+    def to_local_ns(self, server_ns):
+        return server_ns - self.offset_ns
+
+    def local_fire_ns(self, server_arrival_ns, one_way_ns=None):
+        """Local instant to send so the request reaches the server at server_arrival_ns"""
+        if one_way_ns is None:
+            one_way_ns = self.one_way_ns
+        return self.to_local_ns(server_arrival_ns) - one_way_ns
+
+    def describe(self):
+        return (
+            f"server clock {self.offset_ns / 1e6:+.1f} ms ± {self.error_ns / 1e6:.1f} ms, "
+            f"one-way {self.one_way_ns / 1e6:.1f} ms ({self.agreeing}/{len(self.samples)} samples agree)"
+        )
+
+
+class ServerClockEstimator:
+    """Samples the Date header of url across several second boundaries
+
+    Requests are spaced by a step that is not a fraction of a second, so their
+    stamps land at different phases of the server's second; intersecting the
+    intervals they imply narrows the offset down to well below one second.
+    """
+
+    def __init__(self, session, url, clock, samples=24, spacing=0.137):
+        self.session = session
+        self.url = url
+        self.clock = clock
+        self.samples = samples
+        self.spacing = spacing
+
+    def sample(self):
+        sent_ns = self.clock.now_ns()
+        response = self.session.make_request('GET', self.url)
+        received_ns = self.clock.now_ns()
+        if response is None:
+            raise ConnectionError("no response")
+        date = response.headers.get("Date")
+        response.data
+        response.release_conn()
+        parsed = parsedate_tz(date) if date else None
+        if parsed is None:
+            raise ValueError("response has no usable Date header")
+        return DateSample(sent_ns, received_ns, mktime_tz(parsed) * SECOND_NS + BEIJING_OFFSET_NS)
+
+    def run(self):
+        """Return a ServerClockEstimate, or None if no usable Date header came back"""
+        samples = []
+        for _ in range(self.samples):
+            try:
+                samples.append(self.sample())
+            except Exception:
+                pass
+            time.sleep(self.spacing * random.uniform(0.8, 1.2))
+
+        if not samples:
+            return None
+
+        lower, upper, agreeing = marzullo(samples)
+        return ServerClockEstimate(
+            offset_ns=(lower + upper) // 2,
+            error_ns=(upper - lower) // 2,
+            one_way_ns=int(statistics.median(s.round_trip_ns for s in samples)) // 2,
+            samples=samples,
+            agreeing=agreeing,
+        )
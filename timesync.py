@@ -0,0 +1,237 @@
+"""
+Clock synchronization for Xiaomi Unlock Tool
+Queries every NTP server at once and combines the answers into one consensus offset
+"""
+
+import statistics
+import time
+from datetime import datetime, timezone, timedelta
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import ntplib
+
+BEIJING_TZ = timezone(timedelta(hours=8), "UTC+8")
+SECOND_NS = 1_000_000_000
+MINUTE_NS = 60 * SECOND_NS
+DAY_NS = 24 * 60 * MINUTE_NS
+BEIJING_OFFSET_NS = 8 * 60 * MINUTE_NS
+
+# Samples whose round trip is this much slower than the best one are dropped
+DELAY_OUTLIER_FACTOR = 3.0
+DELAY_OUTLIER_FLOOR = 0.020
+# Offsets further than this many scaled MADs from the median are dropped
+OFFSET_OUTLIER_MADS = 3.0
+OFFSET_OUTLIER_FLOOR = 0.005
+# How long to keep waiting for stragglers once a majority has answered
+SETTLE_TIME = 0.3
+
+
+class NTPSample:
+    """One server answer: offset and round-trip delay in seconds"""
+
+    def __init__(self, server, offset, delay, dispersion, stratum):
+        self.server = server
+        self.offset = offset
+        self.delay = delay
+        self.dispersion = dispersion
+        self.stratum = stratum
+
+    @property
+    def error(self):
+        return self.delay / 2 + self.dispersion
+
+    @property
+    def lower(self):
+        return self.offset - self.error
+
+    @property
+    def upper(self):
+        return self.offset + self.error
+
+
+class ClockConsensus:
+    """Combined offset (local clock -> true UTC) with its error bound, in seconds"""
+
+    def __init__(self, offset, error, samples, rejected, failed, elapsed):
+        self.offset = offset
+        self.error = error
+        self.samples = samples
+        self.rejected = rejected
+        self.failed = failed
+        self.elapsed = elapsed
+
+    @property
+    def queried(self):
+        return len(self.samples) + len(self.rejected) + len(self.failed)
+
+    def describe(self):
+        return (
+            f"offset {self.offset * 1000:+.1f} ms ± {self.error * 1000:.1f} ms, "
+            f"{len(self.samples)}/{self.queried} servers agree, "
+            f"synced in {self.elapsed * 1000:.0f} ms"
+        )
+
+
+def split_server(server):
+    """Split "host:port" into (host, port); a bare host uses the ntp port"""
+    host, sep, port = server.rpartition(":")
+    if sep and port.isdigit() and ":" not in host:
+        return host, int(port)
+    return server, "ntp"
+
+
+def query_server(server, timeout=2.0):
+    host, port = split_server(server)
+    response = ntplib.NTPClient().request(host, version=3, port=port, timeout=timeout)
+    return NTPSample(
+        server,
+        response.offset,
+        max(response.delay, 0.0),
+        response.root_delay / 2 + response.root_dispersion,
+        response.stratum,
+    )
+
+
+def reject_outliers(samples):
+    """Split samples into (kept, rejected) by round-trip delay, then by offset"""
+    if len(samples) < 3:
+        return list(samples), []
+
+    best_delay = min(s.delay for s in samples)
+    delay_limit = max(best_delay * DELAY_OUTLIER_FACTOR, best_delay + DELAY_OUTLIER_FLOOR)
+    kept = [s for s in samples if s.delay <= delay_limit]
+    rejected = [s for s in samples if s.delay > delay_limit]
+
+    if len(kept) >= 3:
+        median = statistics.median(s.offset for s in kept)
+        mad = statistics.median(abs(s.offset - median) for s in kept) * 1.4826
+        offset_limit = max(mad * OFFSET_OUTLIER_MADS, OFFSET_OUTLIER_FLOOR)
+        rejected += [s for s in kept if abs(s.offset - median) > offset_limit]
+        kept = [s for s in kept if abs(s.offset - median) <= offset_limit]
+
+    return kept, rejected
+
+
+def marzullo(samples):
+    """Return (lower, upper, count) of the interval agreed on by the most samples"""
+    edges = []
+    for s in samples:
+        edges.append((s.lower, -1))
+        edges.append((s.upper, 1))
+    # Starts sort before ends at the same point so touching intervals still overlap
+    edges.sort()
+
+    best = count = 0
+    lower = upper = None
+    for i, (value, kind) in enumerate(edges):
+        count -= kind
+        if count > best:
+            best = count
+            lower = value
+            upper = edges[i + 1][0]
+    return lower, upper, best
+
+
+def sync_clock(servers, timeout=2.0):
+    """Query all servers in parallel and return a ClockConsensus, or None if none answered"""
+    started = time.perf_counter()
+    samples = []
+    failed = []
+
+    pool = ThreadPoolExecutor(max_workers=len(servers))
+    pending = {pool.submit(query_server, server, timeout): server for server in servers}
+    deadline = started + timeout + 0.5
+    settle_deadline = None
+
+    while pending:
+        now = time.perf_counter()
+        limit = deadline if settle_deadline is None else min(deadline, settle_deadline)
+        if now >= limit:
+            break
+        done, _ = wait(pending, timeout=limit - now, return_when=FIRST_COMPLETED)
+        for future in done:
+            server = pending.pop(future)
+            try:
+                samples.append(future.result())
+            except Exception as e:
+                failed.append((server, e))
+        if settle_deadline is None and len(samples) > len(servers) // 2:
+            settle_deadline = time.perf_counter() + SETTLE_TIME
+
+    for future, server in pending.items():
+        # shutdown(cancel_futures=True) needs Python 3.9
+        future.cancel()
+        failed.append((server, TimeoutError("no answer before consensus was reached")))
+    pool.shutdown(wait=False)
+
+    if not samples:
+        return None
+
+    kept, rejected = reject_outliers(samples)
+    lower, upper, count = marzullo(kept)
+    agreeing = [s for s in kept if s.lower <= upper and s.upper >= lower]
+    rejected += [s for s in kept if s not in agreeing]
+
+    return ClockConsensus(
+        offset=(lower + upper) / 2,
+        error=(upper - lower) / 2,
+        samples=agreeing,
+        rejected=rejected,
+        failed=failed,
+        elapsed=time.perf_counter() - started,
+    )
+
+
+class SyncedClock:
+    """Beijing time anchored to the monotonic clock at the moment of sync
+
+    The NTP offset is paired once with a perf_counter_ns() reading; after that
+    the wall clock is never consulted again, so steps or manual adjustments of
+    the system time cannot move a pending target.
+    """
+
+    def __init__(self, offset_ns=0, error_ns=0):
+        self.offset_ns = offset_ns
+        self.error_ns = error_ns
+        self.anchor_mono_ns = time.perf_counter_ns()
+        self.anchor_utc_ns = time.time_ns() + offset_ns
+
+    @classmethod
+    def from_consensus(cls, consensus):
+        return cls(round(consensus.offset * 1e9), round(consensus.error * 1e9))
+
+    @staticmethod
+    def mono_ns():
+        return time.perf_counter_ns()
+
+    def now_ns(self):
+        """Beijing wall time as integer nanoseconds since the epoch (UTC shifted by +8h)"""
+        return self.anchor_utc_ns + BEIJING_OFFSET_NS + time.perf_counter_ns() - self.anchor_mono_ns
+
+    def to_mono_ns(self, beijing_ns):
+        """Monotonic reading at which now_ns() will equal beijing_ns"""
+        return beijing_ns - self.anchor_utc_ns - BEIJING_OFFSET_NS + self.anchor_mono_ns
+
+    def now(self):
+        return self.to_datetime(self.now_ns())
+
+    @staticmethod
+    def to_datetime(beijing_ns):
+        seconds, ns = divmod(beijing_ns - BEIJING_OFFSET_NS, 1_000_000_000)
+        return datetime.fromtimestamp(seconds, BEIJING_TZ) + timedelta(microseconds=ns // 1000)
+
+
+def next_daily_ns(now_ns, hour, minute, offset_ns=0):
+    """First Beijing instant at hour:minute plus offset_ns that is still after now_ns
+
+    Beijing time has no DST, so days are exactly DAY_NS apart in Beijing ns.
+    """
+    target_ns = now_ns - now_ns % DAY_NS + (hour * 60 + minute) * MINUTE_NS + offset_ns
+    if target_ns <= now_ns:
+        target_ns += DAY_NS
+    return target_ns
+
+
+def format_hms(beijing_ns):
+    seconds = beijing_ns // SECOND_NS % 86400
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Timing model for Xiaomi Unlock Tool
+Records every submission attempt locally and refits the submission-time formula from them
+
+Usage:
+    python timing_model.py fit     Refit the model from recorded attempts and save it
+    python timing_model.py show    Print the model the tool will load
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".miunlocktool")
+ATTEMPTS_PATH = os.path.join(DATA_DIR, "attempts.jsonl")
+MODEL_PATH = os.path.join(DATA_DIR, "timing_model.json")
+
+# The original hand-tuned rule, 59.091 + (166 - ping) * 0.006, as intercept + slope * ping
+LEGACY_INTERCEPT = 59.091 + 166 * 0.006
+LEGACY_SLOPE = -0.006
+# Where the built-in formula lands a request at its reference latency of 166 ms
+LEGACY_ARRIVAL = 59.091 + 0.166 / 2
+
+# Submission seconds the tool accepts, as in manual mode; anything outside is a bad model
+EARLIEST_SECOND = 58.5
+LATEST_SECOND = 59.8
+# A fit needs this many attempts, with measured latencies at least this far apart (ms),
+# before the round trip is regressed on latency rather than assumed to follow it 1:1
+MIN_ATTEMPTS = 5
+MIN_LATENCY_SPREAD = 20.0
+# Round-trip ms per ms of measured latency; a regressed slope is clamped into this range
+MIN_RTT_SLOPE = 0.5
+MAX_RTT_SLOPE = 2.0
+
+
+class TimingModel:
+    """Submission second within 23:59 as a linear function of measured latency in ms
+
+    arrival_second is the second at which the request should reach the server,
+    used when aiming at the server's own clock.
+    """
+
+    def __init__(self, intercept=LEGACY_INTERCEPT, slope=LEGACY_SLOPE, source="built-in formula",
+                 samples=0, fitted_at=None, arrival_second=LEGACY_ARRIVAL):
+        self.intercept = intercept
+        self.slope = slope
+        self.arrival_second = arrival_second
+        self.source = source
+        self.samples = samples
+        self.fitted_at = fitted_at
+
+    def script_time(self, ping_ms):
+        return self.intercept + self.slope * ping_ms
+
+    def describe(self):
+        text = f"{self.intercept:.4f} {self.slope:+.5f} * latency ({self.source}"
+        if self.samples:
+            text += f", {self.samples} attempts"
+        return text + ")"
+
+    def to_dict(self):
+        return {
+            "intercept": self.intercept,
+            "slope": self.slope,
+            "arrival_second": self.arrival_second,
+            "source": self.source,
+            "samples": self.samples,
+            "fitted_at": self.fitted_at,
+        }
+
+    def save(self, path=MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        """Load the fitted model, or the built-in formula if there is none"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(
+                float(data["intercept"]),
+                float(data["slope"]),
+                data.get("source", "fitted"),
+                int(data.get("samples", 0)),
+                data.get("fitted_at"),
+                float(data.get("arrival_second", LEGACY_ARRIVAL)),
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return cls()
+
+
+def record_attempt(record, path=ATTEMPTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    record = dict(record, recorded_at=time.time())
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def load_attempts(path=ATTEMPTS_PATH):
+    attempts = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    attempts.append(json.loads(line))
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return attempts
+
+
+def linear_fit(xs, ys):
+    """Least-squares (intercept, slope); slope is 1 when xs carry no spread"""
+    mean_x = statistics.mean(xs)
+    mean_y = statistics.mean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    if spread == 0:
+        return mean_y - mean_x, 1.0
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+    return mean_y - slope * mean_x, slope
+
+
+def fit(attempts):
+    """Fit a TimingModel from recorded attempts, or return None if there is not enough data
+
+    Each attempt's request is assumed to reach the server half way through its
+    observed POST round trip. The round trip is regressed on the measured latency,
+    and the target arrival is the mean arrival of approved attempts (or, with no
+    approvals yet, the arrival the built-in formula would have produced). Solving
+    fire = target - round_trip(latency) / 2 gives the new coefficients.
+
+    With fewer than MIN_ATTEMPTS attempts there is no fit. With too little spread
+    in latency the round trip is taken to follow latency 1:1, and a regressed slope
+    is clamped to MIN_RTT_SLOPE..MAX_RTT_SLOPE. A fit whose target arrival falls
+    outside EARLIEST_SECOND..LATEST_SECOND is rejected.
+    """
+    usable = [
+        a for a in attempts
+        if a.get("latency_ms") is not None
+        and a.get("fire_second") is not None
+        and a.get("response_second") is not None
+    ]
+    if len(usable) < MIN_ATTEMPTS:
+        return None
+
+    latencies = [a["latency_ms"] for a in usable]
+    round_trips = [(a["response_second"] - a["fire_second"]) * 1000 for a in usable]
+    if max(latencies) - min(latencies) < MIN_LATENCY_SPREAD:
+        rtt_slope = 1.0
+    else:
+        rtt_slope = min(max(linear_fit(latencies, round_trips)[1], MIN_RTT_SLOPE), MAX_RTT_SLOPE)
+    rtt_intercept = statistics.mean(round_trips) - rtt_slope * statistics.mean(latencies)
+
+    def one_way(latency_ms):
+        return (rtt_intercept + rtt_slope * latency_ms) / 2000
+
+    approved = [a for a in usable if a.get("apply_result") == 1]
+    if approved:
+        target = statistics.mean(a["fire_second"] + one_way(a["latency_ms"]) for a in approved)
+        source = "fitted"
+    else:
+        legacy = TimingModel()
+        target = statistics.mean(legacy.script_time(p) + one_way(p) for p in latencies)
+        source = "fitted, no approvals yet"
+    if not EARLIEST_SECOND <= target <= LATEST_SECOND:
+        return None
+
+    return TimingModel(
+        intercept=target - rtt_intercept / 2000,
+        slope=-rtt_slope / 2000,
+        source=source,
+        samples=len(usable),
+        fitted_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+        arrival_second=target,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit the Xiaomi Unlock Tool timing model")
+    parser.add_argument("command", choices=["fit", "show"])
+    parser.add_argument("--attempts", default=ATTEMPTS_PATH, help="attempt log (JSONL)")
+    parser.add_argument("--model", default=MODEL_PATH, help="where the fitted model is stored")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        print(f"Timing model: {TimingModel.load(args.model).describe()}")
+        return 0
+
+    attempts = load_attempts(args.attempts)
+    model = fit(attempts)
+    if model is None:
+        print(f"Not enough usable attempts in {args.attempts} for a plausible fit, keeping the current model")
+        return 1
+    model.save(args.model)
+    print(f"Fitted from {model.samples} of {len(attempts)} attempts: {model.describe()}")
+    print(f"Saved to {args.model}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
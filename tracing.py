@@ -0,0 +1,246 @@
+"""
+Request tracing for Xiaomi Unlock Tool
+Times the DNS, connect, TLS, send, wait and download phases of every HTTP request
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util import parse_url
+from urllib3.util.connection import allowed_gai_family
+
+_local = threading.local()
+
+# Phases that end with the complete request handed to the kernel
+SENT_PHASES = ("send", "send on standby")
+
+
+class RequestTrace:
+    """Phases of one request as (name, start_ns, end_ns) on the perf_counter_ns clock"""
+
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.path = parse_url(url).path or "/"
+        self.thread = threading.current_thread().name
+        self.phases = []
+        self.started_ns = time.perf_counter_ns()
+        self.finished_ns = None
+        self.error = None
+        self.retries = 0
+        # None for plain connections and reused ones; otherwise whether the TLS session was resumed
+        self.tls_resumed = None
+
+    def add(self, name, start_ns, end_ns):
+        self.phases.append((name, start_ns, end_ns))
+
+    @contextmanager
+    def span(self, name):
+        """Record the block as a phase, named "<name> failed" if it raised"""
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        except BaseException:
+            self.add(f"{name} failed", start_ns, time.perf_counter_ns())
+            raise
+        self.add(name, start_ns, time.perf_counter_ns())
+
+    def finish(self, error=None):
+        self.finished_ns = time.perf_counter_ns()
+        self.error = error
+
+    @property
+    def sent(self):
+        """Whether a send phase completed, i.e. the whole request went out at least once"""
+        return any(name in SENT_PHASES for name, _, _ in self.phases)
+
+    @property
+    def total_ns(self):
+        return (self.finished_ns or time.perf_counter_ns()) - self.started_ns
+
+    def describe(self):
+        phases = ", ".join(
+            f"{name} {(end_ns - start_ns) / 1e6:.1f} ms" for name, start_ns, end_ns in self.phases
+        )
+        text = f"{self.method} {self.path}: {phases or 'no phases'} (total {self.total_ns / 1e6:.1f} ms)"
+        if self.retries:
+            text += f", retried {self.retries} times"
+        if self.tls_resumed is not None:
+            text += ", TLS session resumed" if self.tls_resumed else ", full TLS handshake"
+        if self.error is not None:
+            text += f", failed: {self.error}"
+        return text
+
+    def to_events(self, pid, tid):
+        """Chrome trace-event "complete" events for the request and each of its phases"""
+        events = [{
+            "name": f"{self.method} {self.path}",
+            "cat": "request",
+            "ph": "X",
+            "ts": self.started_ns / 1000,
+            "dur": self.total_ns / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": {
+                "url": self.url,
+                "retries": self.retries,
+                "tls_resumed": self.tls_resumed,
+                "error": None if self.error is None else str(self.error),
+            },
+        }]
+        for name, start_ns, end_ns in self.phases:
+            events.append({
+                "name": name,
+                "cat": "phase",
+                "ph": "X",
+                "ts": start_ns / 1000,
+                "dur": (end_ns - start_ns) / 1000,
+                "pid": pid,
+                "tid": tid,
+            })
+        return events
+
+
+class TraceRecorder:
+    """Keeps the most recent finished traces and exports them for Perfetto / chrome://tracing"""
+
+    def __init__(self, capacity=500):
+        self.traces = deque(maxlen=capacity)
+
+    def add(self, trace):
+        self.traces.append(trace)
+
+    def export(self, path):
+        pid = os.getpid()
+        threads = {}
+        events = []
+        for trace in list(self.traces):
+            tid = threads.setdefault(trace.thread, len(threads) + 1)
+            events.extend(trace.to_events(pid, tid))
+        for name, tid in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}})
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(self.traces)
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+def last_trace():
+    """The most recent trace finished on this thread"""
+    return getattr(_local, "last", None)
+
+
+def set_last_trace(trace):
+    _local.last = trace
+
+
+@contextmanager
+def traced(method, url, recorder=None):
+    """Make a new RequestTrace current on this thread for the duration of the block"""
+    trace = RequestTrace(method, url)
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    except BaseException as e:
+        trace.finish(e)
+        raise
+    else:
+        trace.finish()
+    finally:
+        _local.trace = previous
+        _local.last = trace
+        if recorder is not None:
+            recorder.add(trace)
+
+
+class TracingConnectionMixin:
+    """Records connection phases into the current thread's trace, if there is one
+
+    DNS is resolved here rather than inside create_connection so it gets its own
+    span. As create_connection does, lookups honour allowed_gai_family() and
+    every resolved address is tried in turn; each one is swapped in for the host
+    only while connecting to it.
+    """
+
+    def _new_conn(self):
+        trace = current_trace()
+        if trace is None:
+            return super()._new_conn()
+
+        host = self._dns_host
+        try:
+            with trace.span("dns"):
+                results = socket.getaddrinfo(host.strip("[]"), self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        addresses = list(dict.fromkeys(sockaddr[0] for _, _, _, _, sockaddr in results))
+
+        error = None
+        try:
+            with trace.span("connect"):
+                for address in addresses:
+                    self._dns_host = address
+                    try:
+                        return super()._new_conn()
+                    except (ConnectTimeoutError, NewConnectionError) as e:
+                        error = e
+                raise error or NewConnectionError(self, "getaddrinfo returned no addresses")
+        finally:
+            self._dns_host = host
+
+    def request(self, *args, **kwargs):
+        trace = current_trace()
+        if trace is None:
+            return super().request(*args, **kwargs)
+        with trace.span("send"):
+            return super().request(*args, **kwargs)
+
+    def getresponse(self):
+        trace = current_trace()
+        if trace is None:
+            return super().getresponse()
+        with trace.span("wait"):
+            return super().getresponse()
+
+
+class TracingHTTPConnection(TracingConnectionMixin, HTTPConnection):
+    pass
+
+
+class TracingHTTPSConnection(TracingConnectionMixin, HTTPSConnection):
+    def connect(self):
+        trace = current_trace()
+        if trace is None:
+            return super().connect()
+        super().connect()
+        # Everything after the TCP connect span is the TLS handshake
+        for name, start_ns, end_ns in reversed(trace.phases):
+            if name == "connect":
+                trace.add("tls", end_ns, time.perf_counter_ns())
+                break
+        trace.tls_resumed = getattr(self.sock, "session_reused", None)
+
+
+class TracingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TracingHTTPConnection
+
+
+class TracingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TracingHTTPSConnection
+
+
+POOL_CLASSES = {"http": TracingHTTPConnectionPool, "https": TracingHTTPSConnectionPool}